@@ -1,30 +1,21 @@
-# 返回一个包含所有联系人的列表
-import sqlite3
+# 返回一个包含所有好友的列表
 import os
-# TODO 好友判别待完善（可能包含非好友（都在同一个群聊中））
-# username不是@chatroom结尾(群聊) / 不是gh_开头(公众号) 就认为是好友
-def get_all_users(db_path):
+from core.contact_types import FRIEND, get_contact_type_index
+from core.db_connect import DB_ERRORS
+# 返回好友（不含只在群聊中出现的陌生人、公众号与群聊），分类规则见 core/contact_types.py
+# 分类结果按联系人库与消息库缓存，文件变化后才重新计算
+# hex_key：传入时 db_path 为加密的 contact.db，直接解密读取
+# message_dbs：用于判断是否有私聊记录的消息库，None 表示在联系人库旁查找
+# index_dir：消息表位置索引的保存目录
+def get_all_users(db_path, hex_key=None, message_dbs=None, index_dir=None):
     if not os.path.exists(db_path):
         return None
-    ###################################
-    # 读取数据
-    # 1 连接数据库
-    TARGET_TABLE = "Contact"
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor() # 创建游标对象
     user_list = []
     try:
-        query = f"SELECT * FROM {TARGET_TABLE} WHERE username NOT LIKE ? AND username NOT LIKE ?"
-        params = ('gh_%', '%@chatroom')
-
-        cursor.execute(query, params)
-        results = [dict(row) for row in cursor.fetchall()]
-        user_list.extend(results)
-    except sqlite3.Error as e:
+        type_index = get_contact_type_index(db_path, message_dbs, hex_key, index_dir)
+        user_list.extend(type_index.contacts(FRIEND))
+    except DB_ERRORS as e:
         print(f"[-] 数据库操作失败: {e}")
-    finally:
-        conn.close()
     return user_list
 if __name__ == "__main__":
     DB_PATH = ""
@@ -0,0 +1,216 @@
+"""In-memory search index over the Contact table.
+
+Each searchable field is one lower-cased string of all contacts joined by
+``\\0`` plus start offsets, so a query is a few ``str.find`` calls. Remarks and
+nicknames are also indexed by pinyin and initials when pypinyin is installed.
+"""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_right
+from threading import Lock
+from typing import Iterator, List, Optional, Tuple
+
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:  # pypinyin 是可选依赖，缺失时不支持拼音搜索
+    lazy_pinyin = None
+
+from core.contact_record import ContactRecord, load_contacts
+from core.db_connect import DB_ERRORS, SignatureCache
+
+PINYIN_AVAILABLE = lazy_pinyin is not None
+# 按优先级排列的可搜索字段
+SEARCH_FIELDS = ("remark", "nick_name", "username", "description")
+# 额外建立全拼与首字母索引的字段
+PINYIN_FIELDS = ("remark", "nick_name")
+_SEP = "\0"
+# 上一次结果不超过该数量时才逐条收窄，否则整列扫描更快：
+# 2 万联系人时逐条收窄 100 个约 0.36ms、500 个约 1.6ms，整列扫描约 0.5~2.5ms
+NARROW_MAX_CANDIDATES = 100
+
+_indexes = SignatureCache()
+
+
+def _normalize(text) -> str:
+    # 与 SQLite 的 LIKE 一致按不区分大小写匹配；分隔符不能出现在字段内容中
+    return str(text).lower().replace(_SEP, " ") if text else ""
+
+
+def _pinyin_forms(text: str) -> Tuple[str, str]:
+    """(full pinyin, initials) of ``text``; empty when it has no non-ASCII characters."""
+    if not PINYIN_AVAILABLE or not text or text.isascii():
+        # 纯 ASCII 的拼音与原文相同，原文字段已经覆盖
+        return "", ""
+    # 去掉空白，"张 三" 同样能用 zhangsan / zs 找到
+    full = "".join(lazy_pinyin(text)).replace(" ", "")
+    initials = "".join(lazy_pinyin(text, style=Style.FIRST_LETTER)).replace(" ", "")
+    return _normalize(full), _normalize(initials)
+
+
+def _search_order() -> List[str]:
+    order = []
+    for field in SEARCH_FIELDS:
+        order.append(field)
+        if field in PINYIN_FIELDS and PINYIN_AVAILABLE:
+            order.extend((f"{field}_pinyin", f"{field}_initials"))
+    return order
+
+
+class _Column:
+    """One field of every contact, joined into a single string with start offsets."""
+
+    __slots__ = ("text", "starts")
+
+    def __init__(self, values: List[str]) -> None:
+        starts = array("I")
+        pos = 0
+        for value in values:
+            starts.append(pos)
+            pos += len(value) + 1
+        self.text = _SEP.join(values) + _SEP
+        self.starts = starts
+
+    def matches(self, query: str, prefix: bool = False) -> Iterator[int]:
+        """Row numbers whose value contains (or starts with) ``query``, ascending and unique."""
+        text, starts = self.text, self.starts
+        pos = text.find(query)
+        while pos != -1:
+            row = bisect_right(starts, pos) - 1
+            if not prefix or starts[row] == pos:
+                yield row
+            # 同一联系人只需判断一次，直接从下一个联系人的起点继续查找
+            pos = starts[row + 1] if row + 1 < len(starts) else len(text)
+            pos = text.find(query, pos)
+
+    def value(self, row: int) -> str:
+        end = self.starts[row + 1] - 1 if row + 1 < len(self.starts) else len(self.text) - 1
+        return self.text[self.starts[row]:end]
+
+
+class ContactIndex:
+    """Searchable snapshot of the contact table."""
+
+    def __init__(self, rows: List[ContactRecord]) -> None:
+        self._rows = rows
+        self._columns = {
+            field: _Column([_normalize(row.get(field)) for row in rows]) for field in SEARCH_FIELDS
+        }
+        if PINYIN_AVAILABLE:
+            # 重名很常见，同一文本只转换一次
+            converted = {}
+            for field in PINYIN_FIELDS:
+                forms = []
+                for row in rows:
+                    text = row.get(field) or ""
+                    if text not in converted:
+                        converted[text] = _pinyin_forms(str(text))
+                    forms.append(converted[text])
+                self._columns[f"{field}_pinyin"] = _Column([full for full, _ in forms])
+                self._columns[f"{field}_initials"] = _Column([initials for _, initials in forms])
+        self._order = _search_order()
+        self._by_username = {row.get("username"): i for i, row in enumerate(rows) if row.get("username")}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def search(self, query: str, prefix: bool = False, limit: Optional[int] = None) -> List[ContactRecord]:
+        """Contacts matching ``query``, ranked remark > nick_name > username > description."""
+        return self.rows(self.search_rows(query, prefix, limit=limit))
+
+    def search_rows(
+        self,
+        query: str,
+        prefix: bool = False,
+        candidates: Optional[List[int]] = None,
+        limit: Optional[int] = None,
+    ) -> List[int]:
+        """Row numbers matching ``query`` in ranking order; ``limit`` stops the scan early."""
+        # candidates 为上一次较短查询的结果时只在其中收窄；limit 截取的是完整排序结果的前若干个
+        query = _normalize(query)
+        if not query:
+            return list(range(len(self._rows) if limit is None else min(limit, len(self._rows))))
+        if limit is not None and limit <= 0:
+            return []
+        seen = set()
+        ordered = []
+        if candidates is not None and len(candidates) <= NARROW_MAX_CANDIDATES:
+            candidates = sorted(candidates)
+            for field in self._order:
+                column = self._columns[field]
+                for row in candidates:
+                    if row in seen:
+                        continue
+                    value = column.value(row)
+                    if value.startswith(query) if prefix else query in value:
+                        seen.add(row)
+                        ordered.append(row)
+                        if len(ordered) == limit:
+                            return ordered
+            return ordered
+        for field in self._order:
+            # 短查询命中的联系人很多，够数后立即停止扫描
+            for row in self._columns[field].matches(query, prefix):
+                if row not in seen:
+                    seen.add(row)
+                    ordered.append(row)
+                    if len(ordered) == limit:
+                        return ordered
+        return ordered
+
+    def rows(self, row_numbers: List[int]) -> List[ContactRecord]:
+        return [self._rows[row] for row in row_numbers]
+
+    def records(self) -> List[ContactRecord]:
+        """Every contact, in table order."""
+        return list(self._rows)
+
+    def get(self, username: str) -> Optional[ContactRecord]:
+        """The contact row of ``username``, if present."""
+        row = self._by_username.get(username)
+        return self._rows[row] if row is not None else None
+
+
+class ContactSearchSession:
+    """Successive searches that re-check only the previous matches when the query grows."""
+
+    def __init__(self, prefix: bool = False) -> None:
+        self.prefix = prefix
+        self._lock = Lock()
+        self._index = None
+        self._query = ""
+        self._rows = []
+        self._complete = True
+
+    def search(self, index: ContactIndex, query: str, limit: Optional[int] = None) -> List[ContactRecord]:
+        normalized = _normalize(query)
+        with self._lock:
+            candidates = None
+            # 上一次结果被截断时不完整，不能用来收窄
+            if index is self._index and self._query and self._complete:
+                extends = normalized.startswith(self._query) if self.prefix else self._query in normalized
+                if extends:
+                    candidates = self._rows
+        rows = index.search_rows(normalized, self.prefix, candidates, limit)
+        with self._lock:
+            self._index, self._query, self._rows = index, normalized, rows
+            self._complete = limit is None or len(rows) < limit
+        return index.rows(rows)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._index, self._query, self._rows = None, "", []
+
+
+def _load_rows(db_path, hex_key: Optional[str]) -> List[ContactRecord]:
+    try:
+        return load_contacts(db_path, hex_key)
+    except DB_ERRORS as e:
+        print(f"[-] 读取联系人失败: {e}")
+        return []
+
+
+def get_contact_index(db_path, hex_key: Optional[str] = None) -> ContactIndex:
+    """Shared index of ``db_path``, rebuilt when the database file changes."""
+    return _indexes.get(db_path, lambda: ContactIndex(_load_rows(db_path, hex_key)))
@@ -0,0 +1,119 @@
+"""Slim contact rows read from the Contact table.
+
+Only the columns the UI and prompt use are loaded; other columns are fetched
+by id on demand, and ``get`` / ``[]`` keep the dict interface.
+"""
+
+from __future__ import annotations
+
+from typing import List, Optional, Tuple
+
+from core.db_connect import DB_ERRORS, acquire_db, release_db
+
+CONTACT_TABLE = "Contact"
+# 界面与生成祝福需要的字段，其余字段按需读取
+CONTACT_COLUMNS = (
+    "id",
+    "username",
+    "alias",
+    "remark",
+    "nick_name",
+    "description",
+    "small_head_url",
+    "big_head_url",
+    "local_type",
+    "verify_flag",
+)
+
+
+class ContactSource:
+    """The database a batch of records came from; loads the other columns on demand."""
+
+    __slots__ = ("db_path", "hex_key", "columns")
+
+    def __init__(self, db_path, hex_key: Optional[str], columns: Tuple[str, ...]) -> None:
+        self.db_path = str(db_path)
+        self.hex_key = hex_key
+        # Contact 表实际存在的全部列
+        self.columns = frozenset(columns)
+
+    def fetch(self, contact_id, column: str):
+        # 列名只来自表结构，可以直接拼接
+        if column not in self.columns:
+            raise KeyError(column)
+        conn = acquire_db(self.db_path, self.hex_key)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {column} FROM {CONTACT_TABLE} WHERE id = ?", (contact_id,))
+            row = cursor.fetchone()
+            return row[column] if row else None
+        finally:
+            release_db(conn)
+
+
+class ContactRecord:
+    """One contact with only CONTACT_COLUMNS in memory; behaves like a read-only dict."""
+
+    __slots__ = CONTACT_COLUMNS + ("_source",)
+
+    def __init__(self, values, source: Optional[ContactSource] = None) -> None:
+        for column, value in zip(CONTACT_COLUMNS, values):
+            setattr(self, column, value)
+        self._source = source
+
+    def __getitem__(self, key: str):
+        if key in CONTACT_COLUMNS:
+            return getattr(self, key)
+        if self._source is None:
+            raise KeyError(key)
+        try:
+            return self._source.fetch(self.id, key)
+        except DB_ERRORS as e:
+            print(f"[-] 读取联系人字段 {key} 失败: {e}")
+            return None
+
+    def get(self, key: str, default=None):
+        if key in CONTACT_COLUMNS:
+            return getattr(self, key)
+        if self._source is None or key not in self._source.columns:
+            return default
+        return self[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in CONTACT_COLUMNS or (self._source is not None and key in self._source.columns)
+
+    def keys(self) -> List[str]:
+        return list(CONTACT_COLUMNS)
+
+    def to_dict(self) -> dict:
+        return {column: getattr(self, column) for column in CONTACT_COLUMNS}
+
+    def __repr__(self) -> str:
+        return f"ContactRecord(id={self.id!r}, username={self.username!r})"
+
+
+def _table_columns(cursor) -> Tuple[str, ...]:
+    cursor.execute(f"PRAGMA table_info({CONTACT_TABLE})")
+    return tuple(row["name"] for row in cursor.fetchall())
+
+
+def load_contacts(db_path, hex_key: Optional[str] = None, where: str = "", params: tuple = (),
+                  order_by: str = "id") -> List[ContactRecord]:
+    """ContactRecords of the rows matching ``where`` (a SQL condition with ``?`` placeholders)."""
+    conn = acquire_db(db_path, hex_key)
+    cursor = conn.cursor()
+    try:
+        columns = _table_columns(cursor)
+        source = ContactSource(db_path, hex_key, columns)
+        # 表中缺少的列按 NULL 读取，保证每条记录的字段一致
+        projection = ", ".join(column if column in source.columns else f"NULL AS {column}" for column in CONTACT_COLUMNS)
+        query = f"SELECT {projection} FROM {CONTACT_TABLE}"
+        if where:
+            query += f" WHERE {where}"
+        if order_by:
+            query += f" ORDER BY {order_by}"
+        cursor.execute(query, params)
+        return [ContactRecord(tuple(row[column] for column in CONTACT_COLUMNS), source) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        release_db(conn)
@@ -0,0 +1,260 @@
+"""Per-contact message statistics computed from the decrypted shards.
+
+Each shard is read with one UNION ALL query straight into a NumPy array and
+aggregated per contact; results go to ``contact_stats.sqlite``.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+from itertools import chain
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from core.db_connect import (
+    DB_ERRORS,
+    SignatureCache,
+    acquire_db,
+    close_pooled_connections,
+    file_signature,
+    release_db,
+)
+from core.msg_table_index import build_msg_table_index, get_msg_table_index
+from core.name2id_cache import get_sender_names
+from core.utils.str2md5 import str2md5
+
+STATS_NAME = "contact_stats.sqlite"
+SECONDS_PER_DAY = 86400
+# SQLite 复合查询默认最多 500 个 SELECT，每条 UNION ALL 查询合并的表数留有余量
+MAX_UNION_TABLES = 400
+YEAR_SECONDS = 365 * SECONDS_PER_DAY
+# 统计口径变化时递增，旧结果随之重算
+STATS_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contact_stats(
+    contact TEXT PRIMARY KEY,
+    message_count INTEGER NOT NULL,
+    my_count INTEGER NOT NULL,
+    their_count INTEGER NOT NULL,
+    -- 我发的消息数 / 对方发的消息数，对方从未发言时为 NULL
+    my_ratio REAL,
+    first_time INTEGER,
+    last_time INTEGER,
+    last_year_count INTEGER NOT NULL,
+    active_days_last_year INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_contact_stats_last_time ON contact_stats(last_time);
+CREATE INDEX IF NOT EXISTS idx_contact_stats_count ON contact_stats(message_count);
+CREATE TABLE IF NOT EXISTS stats_meta(key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# (排序列, 起始时间) -> 联系人在该顺序中的位置，统计文件变化时重建
+_ranks = SignatureCache()
+
+# 允许排序的列，防止把外部输入直接拼进 SQL
+SORT_COLUMNS = (
+    "message_count",
+    "my_count",
+    "their_count",
+    "my_ratio",
+    "first_time",
+    "last_time",
+    "last_year_count",
+    "active_days_last_year",
+)
+
+
+def contact_stats_path(cache_dir) -> Path:
+    return Path(cache_dir) / STATS_NAME
+
+
+def _read_shard(db_path, hex_key, md5_vals: List[str]) -> np.ndarray:
+    """(table number, create_time, real_sender_id) of every message in ``md5_vals``, as an (n, 3) array."""
+    parts = []
+    conn = acquire_db(db_path, hex_key)
+    cursor = conn.cursor()
+    try:
+        for start in range(0, len(md5_vals), MAX_UNION_TABLES):
+            # 一次查询读出多张表，表序号由 SQL 给出；空值在 SQL 中替换，直接流入 NumPy 数组
+            query = " UNION ALL ".join(
+                f"SELECT {start + i} AS t, COALESCE(create_time, 0) AS create_time, "
+                f"COALESCE(real_sender_id, -1) AS real_sender_id FROM Msg_{md5_val}"
+                for i, md5_val in enumerate(md5_vals[start:start + MAX_UNION_TABLES])
+            )
+            cursor.execute(query)
+            values = chain.from_iterable((row["t"], row["create_time"], row["real_sender_id"]) for row in cursor)
+            parts.append(np.fromiter(values, dtype=np.int64).reshape(-1, 3))
+    finally:
+        cursor.close()
+        release_db(conn)
+    return np.concatenate(parts) if parts else np.empty((0, 3), dtype=np.int64)
+
+
+def _grow(values: np.ndarray, size: int, fill) -> np.ndarray:
+    if values.size >= size:
+        return values
+    return np.concatenate([values, np.full(size - values.size, fill, dtype=values.dtype)])
+
+
+def _shards_signature(db_paths: List[str]) -> str:
+    return json.dumps({Path(p).name: file_signature(p) for p in db_paths}, sort_keys=True)
+
+
+def update_contact_stats(cache_dir, db_paths: Iterable, my_wxid: str, hex_key: Optional[str] = None,
+                         now: Optional[int] = None) -> int:
+    """Recompute the stats table; returns the contact count, or -1 when nothing changed."""
+    db_paths = [str(p) for p in db_paths]
+    stats_path = contact_stats_path(cache_dir)
+    signature = f"v{STATS_VERSION}|" + _shards_signature(db_paths) + "|" + (my_wxid or "")
+    if stats_path.exists():
+        conn = sqlite3.connect(stats_path)
+        try:
+            row = conn.execute("SELECT value FROM stats_meta WHERE key = 'source'").fetchone()
+        except sqlite3.Error:
+            row = None
+        finally:
+            conn.close()
+        if row and row[0] == signature:
+            return -1
+
+    build_msg_table_index(cache_dir, db_paths, hex_key)
+    index = get_msg_table_index(cache_dir)
+    now = int(time.time()) if now is None else int(now)
+    year_start = now - YEAR_SECONDS
+    # 每个联系人一个全局序号，各项统计保存在按序号排列的数组中
+    contact_ids = {}
+    counts = np.zeros(0, dtype=np.int64)
+    mine = np.zeros(0, dtype=np.int64)
+    recent = np.zeros(0, dtype=np.int64)
+    first = np.zeros(0, dtype=np.int64)
+    last = np.zeros(0, dtype=np.int64)
+    day_keys = []
+    for db_path in db_paths:
+        md5_vals = index.tables_in(db_path)
+        if not md5_vals:
+            continue
+        try:
+            data = _read_shard(db_path, hex_key, md5_vals)
+        except DB_ERRORS as e:
+            print(f"[-] 统计 {db_path} 失败: {e}")
+            continue
+        if not data.size:
+            continue
+        names = get_sender_names(db_path, hex_key)
+        # 我在该分库 Name2Id 中的 rowid，各分库互不相同
+        my_id = names.index(my_wxid) if my_wxid in names else -2
+        for md5_val in md5_vals:
+            contact = index.wxid_for(md5_val) or md5_val
+            contact_ids.setdefault(contact, len(contact_ids))
+        size = len(contact_ids)
+        counts, mine, recent = (_grow(a, size, 0) for a in (counts, mine, recent))
+        first = _grow(first, size, np.iinfo(np.int64).max)
+        last = _grow(last, size, np.iinfo(np.int64).min)
+
+        # 表序号 -> 联系人序号，之后整个分库一次性按联系人聚合
+        table_ids = np.array([contact_ids[index.wxid_for(m) or m] for m in md5_vals], dtype=np.int64)
+        ids = table_ids[data[:, 0]]
+        times = data[:, 1]
+        is_recent = times >= year_start
+        np.add.at(counts, ids, 1)
+        np.add.at(mine, ids[data[:, 2] == my_id], 1)
+        np.add.at(recent, ids[is_recent], 1)
+        np.minimum.at(first, ids, times)
+        np.maximum.at(last, ids, times)
+        # (联系人, 天) 组合编码为一个整数，合并各分库后去重计数
+        day_keys.append(np.unique(ids[is_recent] * 1_000_000 + times[is_recent] // SECONDS_PER_DAY))
+
+    active_days = np.zeros(len(contact_ids), dtype=np.int64)
+    if day_keys:
+        np.add.at(active_days, np.unique(np.concatenate(day_keys)) // 1_000_000, 1)
+
+    rows = []
+    for contact, i in contact_ids.items():
+        count = int(counts[i])
+        if not count:
+            continue
+        my_count = int(mine[i])
+        their_count = count - my_count
+        rows.append((
+            contact,
+            count,
+            my_count,
+            their_count,
+            my_count / their_count if their_count else None,
+            int(first[i]),
+            int(last[i]),
+            int(recent[i]),
+            int(active_days[i]),
+        ))
+
+    close_pooled_connections()
+    conn = sqlite3.connect(stats_path)
+    try:
+        conn.executescript(_SCHEMA)
+        conn.execute("DELETE FROM contact_stats")
+        conn.executemany("INSERT INTO contact_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.execute("INSERT OR REPLACE INTO stats_meta(key, value) VALUES ('source', ?)", (signature,))
+        conn.execute("INSERT OR REPLACE INTO stats_meta(key, value) VALUES ('computed_at', ?)", (str(now),))
+        conn.commit()
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def query_contact_stats(
+    cache_dir,
+    order_by: str = "last_time",
+    descending: bool = True,
+    min_messages: int = 0,
+    active_since: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> List[dict]:
+    """Stats rows sorted by ``order_by`` (one of SORT_COLUMNS), optionally filtered."""
+    stats_path = contact_stats_path(cache_dir)
+    if not stats_path.exists():
+        return []
+    if order_by not in SORT_COLUMNS:
+        raise ValueError(f"不支持的排序字段: {order_by}")
+    sql = "SELECT * FROM contact_stats WHERE message_count >= ?"
+    params = [int(min_messages)]
+    if active_since is not None:
+        sql += " AND last_time >= ?"
+        params.append(int(active_since))
+    sql += f" ORDER BY {order_by} {'DESC' if descending else 'ASC'}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    conn = acquire_db(stats_path)
+    try:
+        return [dict(row) for row in conn.execute(sql, tuple(params)).fetchall()]
+    except DB_ERRORS as e:
+        print(f"[-] 读取好友统计失败: {e}")
+        return []
+    finally:
+        release_db(conn)
+
+
+def load_contact_stats(cache_dir) -> Dict[str, dict]:
+    """All stats rows keyed by contact wxid, for joining onto contact lists."""
+    return {row["contact"]: row for row in query_contact_stats(cache_dir)}
+
+
+def contact_ranks(cache_dir, order_by: str = "last_time", active_since: Optional[int] = None) -> Dict[str, int]:
+    """Position of each contact in ``query_contact_stats`` order, cached until the stats file changes."""
+    return _ranks.get(
+        contact_stats_path(cache_dir),
+        lambda: {row["contact"]: i for i, row in enumerate(query_contact_stats(cache_dir, order_by, active_since=active_since))},
+        variant=(order_by, active_since),
+    )
+
+
+def rank_of(ranks: Dict[str, int], username: str) -> Optional[int]:
+    """Position of ``username`` in ``contact_ranks`` output; None if it has no messages there."""
+    rank = ranks.get(username)
+    # 分库中找不到 wxid 的聊天以表名中的 MD5 记录
+    return rank if rank is not None else ranks.get(str2md5(username))
@@ -0,0 +1,121 @@
+"""Classify contacts as friend, group-only, official account or chatroom.
+
+Classification uses ``local_type`` / ``verify_flag`` and, for unknown types,
+whether a ``Msg_<md5>`` chat table exists. Results are cached per file set.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, List, Optional
+
+from core.contact_index import ContactIndex
+from core.contact_record import ContactRecord, load_contacts
+from core.db_connect import DB_ERRORS, SignatureCache
+from core.msg_table_index import find_message_dbs, get_msg_table_index
+from core.utils.str2md5 import str2md5
+
+FRIEND = "friend"
+GROUP_ONLY = "group_only"
+OFFICIAL = "official"
+CHATROOM = "chatroom"
+CONTACT_TYPES = (FRIEND, GROUP_ONLY, OFFICIAL, CHATROOM)
+
+# Contact.local_type 的取值
+LOCAL_TYPE_FRIEND = 1
+LOCAL_TYPE_GROUP_MEMBER = 3
+# 微信内置的服务账号，不是好友
+SYSTEM_USERNAMES = frozenset({
+    "filehelper",
+    "weixin",
+    "fmessage",
+    "medianote",
+    "floatbottle",
+    "notifymessage",
+    "qqmail",
+})
+
+# 联系人库 -> 分类结果，联系人库或任一消息库变化时重建
+_indexes = SignatureCache()
+
+
+def classify_contact(username: str, local_type, verify_flag, has_chat: Optional[bool] = None) -> str:
+    """Type of one contact; ``has_chat=None`` means the message shards are unknown."""
+    username = username or ""
+    if username.endswith("@chatroom"):
+        return CHATROOM
+    if username.startswith("gh_") or username in SYSTEM_USERNAMES or verify_flag:
+        return OFFICIAL
+    if local_type == LOCAL_TYPE_FRIEND:
+        return FRIEND
+    if local_type == LOCAL_TYPE_GROUP_MEMBER:
+        return GROUP_ONLY
+    # 未知类型：有私聊记录的视为好友；没有消息库可查时沿用旧的判断，视为好友
+    return GROUP_ONLY if has_chat is False else FRIEND
+
+
+class ContactTypeIndex:
+    """Contacts grouped by type, plus username -> type."""
+
+    def __init__(self, records: Iterable[ContactRecord], chat_tables: Optional[set] = None) -> None:
+        self._types = {}
+        self._by_type = {kind: [] for kind in CONTACT_TYPES}
+        for record in records:
+            has_chat = None if chat_tables is None else str2md5(record.username or "") in chat_tables
+            kind = classify_contact(record.username, record.local_type, record.verify_flag, has_chat)
+            self._types[record.username] = kind
+            self._by_type[kind].append(record)
+        self._lock = Lock()
+        self._search_indexes = {}
+
+    def type_of(self, username: str) -> Optional[str]:
+        return self._types.get(username)
+
+    def is_friend(self, username: str) -> bool:
+        return self._types.get(username) == FRIEND
+
+    def contacts(self, kind: str = FRIEND) -> List[ContactRecord]:
+        return list(self._by_type[kind])
+
+    def counts(self) -> Dict[str, int]:
+        return {kind: len(records) for kind, records in self._by_type.items()}
+
+    def search_index(self, kind: str = FRIEND) -> ContactIndex:
+        """Search index over the contacts of ``kind`` only, built on first use."""
+        # 在锁内构建，并发的搜索不会重复转换拼音
+        with self._lock:
+            index = self._search_indexes.get(kind)
+            if index is None:
+                index = self._search_indexes[kind] = ContactIndex(self._by_type[kind])
+            return index
+
+
+# message_dbs=None 时在联系人库旁查找消息分库；index_dir 为消息表索引的保存目录，解密副本默认为其缓存目录
+def get_contact_type_index(
+    contact_db,
+    message_dbs: Optional[Iterable] = None,
+    hex_key: Optional[str] = None,
+    index_dir=None,
+) -> ContactTypeIndex:
+    """Shared classification of ``contact_db``, rebuilt when it or a message shard changes."""
+    if index_dir is None and not hex_key:
+        index_dir = Path(contact_db).parent
+    message_dbs = [str(p) for p in (find_message_dbs(contact_db, hex_key) if message_dbs is None else message_dbs)]
+    return _indexes.get(contact_db, lambda: _build_index(contact_db, message_dbs, hex_key, index_dir), message_dbs)
+
+
+def _build_index(contact_db, message_dbs: List[str], hex_key: Optional[str], index_dir) -> ContactTypeIndex:
+    chat_tables = None
+    if message_dbs:
+        msg_index = get_msg_table_index(index_dir)
+        msg_index.refresh(message_dbs, hex_key)
+        chat_tables = set()
+        for db_path in message_dbs:
+            chat_tables.update(msg_index.tables_in(db_path))
+    try:
+        records = load_contacts(contact_db, hex_key)
+    except DB_ERRORS as e:
+        print(f"[-] 读取联系人失败: {e}")
+        records = []
+    return ContactTypeIndex(records, chat_tables)
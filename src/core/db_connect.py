@@ -0,0 +1,175 @@
+"""Single entry point for the data layer to open a WeChat database.
+
+Decrypted copies are opened with sqlite3, encrypted ``.db`` files (hex key
+given) through the decrypt-on-read VFS. Provides a read-only connection pool
+and a cache for data built from database files.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Iterable, Optional
+
+from core.encrypted_vfs import db_errors, open_encrypted_db
+from core.wal_decrypt import wal_path_for
+
+# sqlite3 与 apsw 的异常类型，数据层统一捕获
+DB_ERRORS = db_errors()
+
+# 每个数据库最多保留的空闲连接数
+POOL_MAX_IDLE = 4
+# 每个连接的页缓存（负数单位为 KiB，即 16MB）
+POOL_CACHE_SIZE = -16384
+# 内存映射读取的上限（256MB），只对解密后的 sqlite 副本生效
+POOL_MMAP_SIZE = 256 * 1024 * 1024
+
+
+def connect_db(db_path, hex_key: Optional[str] = None):
+    if hex_key:
+        return open_encrypted_db(db_path, hex_key)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _open_readonly(db_path, hex_key: Optional[str]):
+    if hex_key:
+        conn = open_encrypted_db(db_path, hex_key)
+        conn.execute(f"PRAGMA cache_size={POOL_CACHE_SIZE}")
+        return conn
+    uri = f"{Path(db_path).resolve().as_uri()}?mode=ro&immutable=1"
+    # 连接可能被不同的 Qt 工作线程借出，同一时刻只会有一个线程使用
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA cache_size={POOL_CACHE_SIZE}")
+    conn.execute(f"PRAGMA mmap_size={POOL_MMAP_SIZE}")
+    return conn
+
+
+def file_signature(db_path) -> Optional[tuple]:
+    """(size, mtime) of a database plus its -wal sidecar; None if the file is missing."""
+    try:
+        stat = os.stat(db_path)
+    except OSError:
+        return None
+    signature = (stat.st_size, stat.st_mtime_ns)
+    wal_file = wal_path_for(Path(db_path))
+    if wal_file.exists():
+        wal_stat = wal_file.stat()
+        signature += (wal_stat.st_size, wal_stat.st_mtime_ns)
+    return signature
+
+
+def path_key(db_path) -> str:
+    """Normalized absolute path, the cache key of a database file."""
+    return os.path.normcase(os.path.abspath(str(db_path)))
+
+
+class SignatureCache:
+    """Values built from database files, rebuilt when one of the files changes."""
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        # (规范化路径, variant) -> (各文件签名, 值)
+        self._entries = {}
+        # (规范化路径, variant) -> 构建锁，同一个值同一时刻只构建一次
+        self._build_locks = {}
+
+    def _cached(self, key: tuple, signature: tuple):
+        cached = self._entries.get(key)
+        return cached if cached is not None and cached[0] == signature else None
+
+    def get(self, db_path, build: Callable, extra_paths: Iterable = (), variant=None):
+        """Cached value of ``db_path``, rebuilt when it or any of ``extra_paths`` changed."""
+        signature = tuple((path_key(p), file_signature(p)) for p in (db_path, *extra_paths))
+        key = (signature[0][0], variant)
+        with self._lock:
+            cached = self._cached(key, signature)
+            if cached is not None:
+                return cached[1]
+            build_lock = self._build_locks.setdefault(key, Lock())
+        # 构建较慢时（如首次加载联系人索引）并发的调用等待同一次构建，而不是各自重建
+        with build_lock:
+            with self._lock:
+                cached = self._cached(key, signature)
+                if cached is not None:
+                    return cached[1]
+            value = build()
+            with self._lock:
+                self._entries[key] = (signature, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class _ConnectionPool:
+    """Idle read-only connections per (database, key), invalidated by file signature."""
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        # (规范化路径, 密钥) -> (文件签名, 空闲连接列表)
+        self._idle = {}
+        # id(连接) -> (池键, 借出时的文件签名)
+        self._borrowed = {}
+
+    def acquire(self, db_path, hex_key: Optional[str] = None):
+        key = (path_key(db_path), hex_key or None)
+        signature = file_signature(db_path)
+        stale = []
+        conn = None
+        with self._lock:
+            pooled_signature, idle = self._idle.get(key, (None, []))
+            if pooled_signature != signature:
+                # 文件已被重写（重新解密或微信写入），旧连接的缓存已失效
+                stale, idle = idle, []
+            if idle:
+                conn = idle.pop()
+            self._idle[key] = (signature, idle)
+        for old in stale:
+            old.close()
+        if conn is None:
+            conn = _open_readonly(db_path, hex_key)
+        with self._lock:
+            self._borrowed[id(conn)] = (key, signature)
+        return conn
+
+    def release(self, conn) -> None:
+        with self._lock:
+            key, signature = self._borrowed.pop(id(conn), (None, None))
+            pooled_signature, idle = self._idle.get(key, (None, None))
+            keep = idle is not None and signature == pooled_signature and len(idle) < POOL_MAX_IDLE
+            if keep:
+                idle.append(conn)
+        if not keep:
+            conn.close()
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle = [conn for _, conns in self._idle.values() for conn in conns]
+            self._idle.clear()
+            # 借出中的连接归还时不再放回池中，直接关闭
+            self._borrowed = {k: (None, None) for k in self._borrowed}
+        for conn in idle:
+            conn.close()
+
+
+_pool = _ConnectionPool()
+
+
+def acquire_db(db_path, hex_key: Optional[str] = None):
+    """Borrow a read-only connection from the shared pool; give it back with :func:`release_db`."""
+    return _pool.acquire(db_path, hex_key)
+
+
+def release_db(conn) -> None:
+    _pool.release(conn)
+
+
+def close_pooled_connections() -> None:
+    """Close every idle pooled connection, e.g. before the decrypted files are rewritten."""
+    _pool.close_all()
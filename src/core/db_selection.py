@@ -0,0 +1,70 @@
+"""Selection and ordering of the WeChat databases to decrypt.
+
+Patterns are globs matched against the file name and the path relative to the
+WeChat data folder, so ``contact.db`` and ``contact/contact.db`` both work.
+"""
+
+from __future__ import annotations
+
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence
+
+# 内置的选择方案：include 为 None 表示不过滤
+# friends：好友页只会读取 contact.sqlite 与 message_N.sqlite
+DB_PROFILES = {
+    "all": {
+        "include": None,
+        "priority": ["contact.db", "message_[0-9]*.db"],
+    },
+    "friends": {
+        "include": ["contact.db", "message_[0-9]*.db"],
+        "priority": ["contact.db", "message_[0-9]*.db"],
+    },
+}
+DEFAULT_PROFILE = "all"
+
+
+def _matches(path: Path, base_dir: Path, patterns: Iterable[str]) -> bool:
+    try:
+        rel = path.relative_to(base_dir).as_posix()
+    except ValueError:
+        rel = path.name
+    return any(fnmatch(path.name, pat) or fnmatch(rel, pat) for pat in patterns)
+
+
+def _priority_of(path: Path, base_dir: Path, priority: Sequence[str]) -> int:
+    for index, pattern in enumerate(priority):
+        if _matches(path, base_dir, [pattern]):
+            return index
+    return len(priority)
+
+
+# 显式的 include / priority 覆盖方案中的设置，exclude 始终生效；先按优先级分组，组内大文件优先
+def select_db_files(
+    db_paths: Iterable[Path],
+    base_dir: Path,
+    *,
+    profile: Optional[str] = None,
+    include: Optional[Sequence[str]] = None,
+    exclude: Optional[Sequence[str]] = None,
+    priority: Optional[Sequence[str]] = None,
+) -> List[Path]:
+    """Filter ``db_paths`` and return them in decryption order."""
+    settings = DB_PROFILES.get(profile or DEFAULT_PROFILE)
+    if settings is None:
+        raise ValueError(f"未知的解密方案: {profile}")
+    include = include if include else settings["include"]
+    priority = priority if priority else (settings["priority"] or [])
+    base_dir = Path(base_dir)
+
+    selected = []
+    for path in db_paths:
+        if include and not _matches(path, base_dir, include):
+            continue
+        if exclude and _matches(path, base_dir, exclude):
+            continue
+        selected.append(path)
+
+    selected.sort(key=lambda p: (_priority_of(p, base_dir, priority), -p.stat().st_size))
+    return selected
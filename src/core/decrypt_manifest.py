@@ -0,0 +1,133 @@
+"""Incremental decryption manifest stored next to the decrypted cache.
+
+Keeps each source file's size, mtime and per-page HMAC prefix, so a re-run
+skips unchanged files and only rewrites changed pages.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from core.utils.wechat_constants import WeChatDecryptConstants
+
+MANIFEST_NAME = "decrypt_manifest.json"
+PRINTS_DIR_NAME = "decrypt_manifest"
+MANIFEST_VERSION = 1
+# 每页指纹取页内 HMAC 的前 8 字节
+PAGE_PRINT_SIZE = 8
+# 全 0 指纹表示该页的解密结果不来自 .db 本身（如来自 WAL），下次需要从 .db 重新解密
+EMPTY_PRINT = bytes(PAGE_PRINT_SIZE)
+
+
+def page_print_offset() -> int:
+    """Offset of the fingerprint bytes (start of the stored HMAC) inside a page."""
+    constants = WeChatDecryptConstants()
+    return constants.PAGE_SIZE - constants.RESERVE_SIZE + constants.IV_SIZE
+
+
+def key_id(hex_key: str) -> str:
+    """Short, non-reversible identifier of the key a cache was decrypted with."""
+    return hashlib.sha256(b"wx-decrypt-manifest" + bytes.fromhex(hex_key)).hexdigest()[:16]
+
+
+def _signature(stat: Optional[os.stat_result]) -> Optional[list]:
+    if stat is None:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class DecryptManifest:
+    """Per-output bookkeeping of what has already been decrypted."""
+
+    def __init__(self, output_dir: Path, hex_key: str) -> None:
+        self._dir = Path(output_dir)
+        self._path = self._dir / MANIFEST_NAME
+        self._prints_dir = self._dir / PRINTS_DIR_NAME
+        self._key_id = key_id(hex_key)
+        self._files = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self._path.exists():
+            return
+        try:
+            data = json.loads(self._path.read_text(encoding="utf-8"))
+        except Exception:
+            return
+        # 密钥变化或格式升级后，旧记录全部作废
+        if data.get("version") != MANIFEST_VERSION or data.get("key_id") != self._key_id:
+            return
+        self._files = data.get("files", {})
+
+    def save(self) -> None:
+        self._dir.mkdir(parents=True, exist_ok=True)
+        data = {"version": MANIFEST_VERSION, "key_id": self._key_id, "files": self._files}
+        tmp_path = self._path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self._path)
+
+    def _prints_path(self, name: str) -> Path:
+        return self._prints_dir / f"{name}.pages"
+
+    def _output_matches(self, entry: Dict[str, Any], out_file: Path) -> bool:
+        if not out_file.exists():
+            return False
+        return out_file.stat().st_size == entry.get("pages", -1) * WeChatDecryptConstants().PAGE_SIZE
+
+    def is_unchanged(self, name: str, src_stat: os.stat_result, out_file: Path) -> bool:
+        """True when the source file and its decrypted output are both up to date."""
+        entry = self._files.get(name)
+        if not entry or not entry.get("complete"):
+            return False
+        if entry.get("size") != src_stat.st_size or entry.get("mtime_ns") != src_stat.st_mtime_ns:
+            return False
+        return self._output_matches(entry, out_file)
+
+    def wal_unchanged(self, name: str, wal_stat: Optional[os.stat_result]) -> bool:
+        """True when the -wal sidecar is in the same state as when it was last applied."""
+        entry = self._files.get(name) or {}
+        return entry.get("wal") == _signature(wal_stat)
+
+    def old_prints(self, name: str, out_file: Path) -> Optional[bytes]:
+        """Page fingerprints of the previous run, or None if a full decrypt is needed."""
+        entry = self._files.get(name)
+        if not entry or not self._output_matches(entry, out_file):
+            return None
+        try:
+            prints = self._prints_path(name).read_bytes()
+        except OSError:
+            return None
+        if len(prints) != entry["pages"] * PAGE_PRINT_SIZE:
+            return None
+        return prints
+
+    def record(
+        self,
+        name: str,
+        src_stat: os.stat_result,
+        prints: bytes,
+        *,
+        wal_stat: Optional[os.stat_result] = None,
+        complete: bool = True,
+    ) -> None:
+        """Store the fingerprints of a finished (or partially finished) output."""
+        self._prints_dir.mkdir(parents=True, exist_ok=True)
+        self._prints_path(name).write_bytes(prints)
+        self._files[name] = {
+            "size": src_stat.st_size,
+            "mtime_ns": src_stat.st_mtime_ns,
+            "pages": len(prints) // PAGE_PRINT_SIZE,
+            "wal": _signature(wal_stat),
+            "complete": complete,
+        }
+
+    def forget(self, name: str) -> None:
+        self._files.pop(name, None)
+        try:
+            self._prints_path(name).unlink()
+        except OSError:
+            pass
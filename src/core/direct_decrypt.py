@@ -1,106 +1,629 @@
-import hashlib
-import hmac
-import sqlite3
 from pathlib import Path
 from Crypto.Cipher import AES
+import numpy as np
 import os
+from fnmatch import fnmatch
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from core.key_cache import (
+    cached_keys,
+    get_derived_keys,
+    load_key_cache,
+    remember_keys,
+    save_key_cache,
+)
+from core.db_connect import close_pooled_connections
+from core.db_selection import select_db_files
+from core.decrypt_manifest import EMPTY_PRINT, PAGE_PRINT_SIZE, DecryptManifest, page_print_offset
+from core.contact_stats import update_contact_stats
+from core.message_search import update_message_fts
+from core.message_store import update_message_store
+from core.msg_table_index import MSG_DB_PATTERN, build_msg_table_index
+from core.wal_decrypt import apply_wal, wal_path_for
+from core.utils.decrypt_progress import DecryptCancelled, DecryptProgress
+from core.utils.page_cipher import decrypt_page, verify_page_hmac
 from core.utils.wechat_constants import WeChatDecryptConstants
 
-# 解压单个.db文件
-def decrypt_wechat_db(input_path, output_path, hex_key):
+# 流式解密时每个读取窗口包含的页数（256 页 * 4096 字节 = 1MB）
+STREAM_CHUNK_PAGES = 256
+# 文件内并行时每个任务负责的页数（8192 页 * 4096 字节 = 32MB），
+# 页数超过两个分段的文件才会被拆分
+RANGE_PAGES = 8192
+
+# 读取数据库第一页前 16 字节的 Salt
+def read_salt(input_path):
+    with open(input_path, "rb") as f:
+        return f.read(WeChatDecryptConstants().SALT_SIZE)
+
+# 用第一页的 HMAC 校验密钥是否正确，只需读取一页，无需解密整个文件
+def verify_key(db_path, hex_key) -> bool:
     constants = WeChatDecryptConstants()
     page_size = constants.PAGE_SIZE
-    salt_size = constants.SALT_SIZE
-    iter_count = constants.ITER_COUNT
-    key_size = constants.KEY_SIZE
-    reserve_size = constants.RESERVE_SIZE
-    iv_size = constants.IV_SIZE
-    sql_file_header = constants.SQLITE_FILE_HEADER
+    try:
+        raw_key = bytes.fromhex(hex_key)
+    except (TypeError, ValueError):
+        return False
+    if len(raw_key) != constants.KEY_SIZE:
+        return False
+    with open(db_path, "rb") as f:
+        first_page = f.read(page_size)
+    if len(first_page) < page_size:
+        return False
+    _, mac_key = get_derived_keys(raw_key, first_page[: constants.SALT_SIZE])
+    return verify_page_hmac(mac_key, first_page, 0)
+
+# 找到目录下最小的一个完整 .db 文件（至少一页），用于快速校验密钥
+# db_paths: 只在这些文件中挑选，None 表示扫描整个 db_dir
+def find_probe_db(db_dir, db_paths=None):
+    page_size = WeChatDecryptConstants().PAGE_SIZE
+    if db_paths is None:
+        db_paths = Path(db_dir).rglob("*.db")
+    candidates = [p for p in db_paths if p.stat().st_size >= page_size]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda p: p.stat().st_size)
+
+# 批量解密窗口内的 count 个页：整个窗口只做一次 AES-ECB 解密，
+# 再用 numpy 与前一个密文块 (每页第一个块与 IV) 异或，等价于逐页 AES-CBC
+# first_page: 窗口内第一页的全局页号（第 0 页需要特殊处理 Salt 与文件头）
+def _decrypt_pages_batch(ecb, in_view, out_view, in_blocks, out_blocks, count, first_page):
+    constants = WeChatDecryptConstants()
+    page_size = constants.PAGE_SIZE
+    iv_block = (page_size - constants.RESERVE_SIZE) // AES.block_size
+    ecb.decrypt(in_view[: count * page_size], output=out_view[: count * page_size])
+    src = in_blocks[:count]
+    dst = out_blocks[:count]
+    dst[:, 1:iv_block] ^= src[:, : iv_block - 1]
+    dst[:, 0] ^= src[:, iv_block]
+    # 预留区 (IV + HMAC) 在输出中补 0
+    dst[:, iv_block:] = 0
+    if first_page == 0:
+        # 第一页前 16 字节是 Salt，密文从第二个块开始，其前一个块应为 IV 而不是 Salt
+        dst[0, 1] ^= src[0, 0] ^ src[0, iv_block]
+        out_view[: constants.SALT_SIZE] = constants.SQLITE_FILE_HEADER
+
+# 解密 [start_page, end_page) 范围内的页，写入输出文件中对应的偏移处
+# 输出文件需要已经存在（由调用方创建或预分配），每页在输出中的位置与输入一致
+# old_prints: 上次解密时该区间的页指纹，指纹未变化的页直接跳过
+# on_chunk: 每处理完一个读取窗口后以窗口字节数调用，用于汇报进度
+# 返回 (该区间的新页指纹, 实际重写的页数)
+def _decrypt_page_range(input_path, output_path, enc_key, start_page, end_page,
+                        chunk_pages=STREAM_CHUNK_PAGES, old_prints=None, on_chunk=None):
+    page_size = WeChatDecryptConstants().PAGE_SIZE
+    if end_page <= start_page:
+        return b"", 0
+    chunk_pages = max(1, min(int(chunk_pages), end_page - start_page))
+    blocks_per_page = page_size // AES.block_size
+
+    # 预分配输入 / 输出窗口，整个解密过程中复用；numpy 视图与缓冲区共享内存
+    in_buf = bytearray(page_size * chunk_pages)
+    out_buf = bytearray(page_size * chunk_pages)
+    in_view = memoryview(in_buf)
+    out_view = memoryview(out_buf)
+    in_blocks = np.frombuffer(in_buf, dtype=np.uint8).reshape(chunk_pages, blocks_per_page, AES.block_size)
+    out_blocks = np.frombuffer(out_buf, dtype=np.uint8).reshape(chunk_pages, blocks_per_page, AES.block_size)
+    in_pages = in_blocks.reshape(chunk_pages, page_size)
+    print_offset = page_print_offset()
+    prints = bytearray((end_page - start_page) * PAGE_PRINT_SIZE)
+    old_prints = np.frombuffer(old_prints or b"", dtype=np.uint8)
+    ecb = AES.new(enc_key, AES.MODE_ECB)
+    changed = 0
+
+    with open(input_path, "rb") as f_in, open(output_path, "r+b") as f_out:
+        f_in.seek(start_page * page_size)
+        page_index = start_page
+        while page_index < end_page:
+            want = min(chunk_pages, end_page - page_index) * page_size
+            read_size = f_in.readinto(in_view[:want])
+            # 末尾不足一页的数据直接丢弃
+            page_count = read_size // page_size
+            if page_count == 0:
+                break
+
+            # 记录每页指纹，并与旧指纹比较得到需要重写的页
+            rel = (page_index - start_page) * PAGE_PRINT_SIZE
+            fingerprints = in_pages[:page_count, print_offset : print_offset + PAGE_PRINT_SIZE]
+            prints[rel : rel + page_count * PAGE_PRINT_SIZE] = fingerprints.tobytes()
+            old = old_prints[rel : rel + page_count * PAGE_PRINT_SIZE]
+            if len(old) == page_count * PAGE_PRINT_SIZE:
+                dirty = (fingerprints != old.reshape(page_count, PAGE_PRINT_SIZE)).any(axis=1)
+            else:
+                dirty = np.ones(page_count, dtype=bool)
+
+            if dirty.any():
+                _decrypt_pages_batch(ecb, in_view, out_view, in_blocks, out_blocks, page_count, page_index)
+                if dirty.all():
+                    # 没有可跳过的页时整个窗口只写一次
+                    f_out.seek(page_index * page_size)
+                    f_out.write(out_view[: page_count * page_size])
+                else:
+                    # 连续需要重写的页合并为一次写入
+                    run_start = None
+                    for j in range(page_count + 1):
+                        if j < page_count and dirty[j]:
+                            if run_start is None:
+                                run_start = j
+                        elif run_start is not None:
+                            f_out.seek((page_index + run_start) * page_size)
+                            f_out.write(out_view[run_start * page_size : j * page_size])
+                            run_start = None
+                changed += int(dirty.sum())
+            page_index += page_count
+            if on_chunk is not None:
+                on_chunk(page_count * page_size)
+            if read_size < want:
+                break
+    return bytes(prints[: (page_index - start_page) * PAGE_PRINT_SIZE]), changed
+
+# 把页数切分为若干个 [start, end) 区间
+def _split_page_ranges(page_count, range_pages=None):
+    range_pages = max(1, int(range_pages or RANGE_PAGES))
+    return [(start, min(start + range_pages, page_count)) for start in range(0, page_count, range_pages)]
+
+# 预分配输出文件，使各个分段可以直接写到最终偏移处
+# keep=True 时保留已有内容（增量解密），只调整文件长度
+def _prepare_output(output_path, page_count, keep=False):
+    mode = "r+b" if keep and os.path.exists(output_path) else "wb"
+    with open(output_path, mode) as f_out:
+        f_out.truncate(page_count * WeChatDecryptConstants().PAGE_SIZE)
+
+# 取出某个页区间对应的旧指纹
+def _slice_prints(old_prints, start, end):
+    if old_prints is None:
+        return None
+    return old_prints[start * PAGE_PRINT_SIZE : end * PAGE_PRINT_SIZE]
+
+# 取消标志已被设置
+def _cancelled(cancel_event):
+    return cancel_event is not None and cancel_event.is_set()
+
+# 按区间顺序拼接各分段的结果，返回 (页指纹, 重写页数, 密钥, 是否全部完成)
+# 未完成的区间沿用旧指纹（输出中对应内容未被改动），没有旧指纹的页补空指纹，下次运行时只重做这些页
+def _assemble_ranges(parts, ranges, old_prints, keys):
+    chunks = []
+    changed = 0
+    for start, end in ranges:
+        part = parts.get(start)
+        if part is None:
+            old = _slice_prints(old_prints, start, end) or b""
+            chunks.append(old + EMPTY_PRINT * (end - start - len(old) // PAGE_PRINT_SIZE))
+        else:
+            chunks.append(part[0])
+            changed += part[1]
+    return b"".join(chunks), changed, keys, len(parts) == len(ranges)
+
+# 解密单个文件，返回 (页指纹, 实际重写的页数)
+# on_chunk: 进度回调，参数为新完成的字节数；cancel_event 被设置时在区间之间停止并抛出 DecryptCancelled
+def _decrypt_file(input_path, output_path, enc_key, chunk_pages=STREAM_CHUNK_PAGES, max_workers=1, old_prints=None,
+                  on_chunk=None, cancel_event=None):
+    page_size = WeChatDecryptConstants().PAGE_SIZE
+    page_count = os.path.getsize(input_path) // page_size
+    ranges = _split_page_ranges(page_count)
+    _prepare_output(output_path, page_count, keep=old_prints is not None)
+    parts = []
+    if max_workers is not None and max_workers > 1 and len(ranges) > 2:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(ranges))) as executor:
+            futures = [
+                executor.submit(_decrypt_page_range, input_path, output_path, enc_key, start, end,
+                                chunk_pages, _slice_prints(old_prints, start, end))
+                for start, end in ranges
+            ]
+            for future, (start, end) in zip(futures, ranges):
+                if _cancelled(cancel_event):
+                    for pending in futures:
+                        pending.cancel()
+                    raise DecryptCancelled()
+                parts.append(future.result())
+                if on_chunk is not None:
+                    on_chunk((end - start) * page_size)
+    else:
+        for start, end in ranges:
+            if _cancelled(cancel_event):
+                raise DecryptCancelled()
+            parts.append(_decrypt_page_range(input_path, output_path, enc_key, start, end, chunk_pages,
+                                             _slice_prints(old_prints, start, end), on_chunk))
+    return b"".join(p for p, _ in parts), sum(c for _, c in parts)
+
+# 按页号逐页重新解密指定的页，返回 {页号: 新指纹}
+def _rewrite_pages(input_path, output_path, enc_key, page_indices):
+    page_size = WeChatDecryptConstants().PAGE_SIZE
+    print_offset = page_print_offset()
+    fingerprints = {}
+    with open(input_path, "rb") as f_in, open(output_path, "r+b") as f_out:
+        for index in page_indices:
+            f_in.seek(index * page_size)
+            page = f_in.read(page_size)
+            if len(page) < page_size:
+                break
+            f_out.seek(index * page_size)
+            f_out.write(decrypt_page(enc_key, page, index))
+            fingerprints[index] = page[print_offset : print_offset + PAGE_PRINT_SIZE]
+    return fingerprints
+
+# 把 -wal 文件中已提交的页应用到解密结果上，返回 (新的页指纹, 从 .db 恢复的页数, 从 WAL 写入的页数)
+# restore=True 表示 .db 本身没有变化：先把上次来自 WAL 的页（指纹为空）从 .db 恢复，再应用当前 WAL，
+# 耗时只与 WAL 大小成正比
+def _refresh_from_wal(db_file, out_file, enc_key, prints, restore=False):
+    page_size = WeChatDecryptConstants().PAGE_SIZE
+    prints = bytearray(prints)
+    restored = 0
+    if restore:
+        db_pages = os.path.getsize(db_file) // page_size
+        dirty = [
+            i for i in range(db_pages)
+            if prints[i * PAGE_PRINT_SIZE : (i + 1) * PAGE_PRINT_SIZE] in (EMPTY_PRINT, b"")
+        ]
+        _prepare_output(str(out_file), db_pages, keep=True)
+        del prints[db_pages * PAGE_PRINT_SIZE :]
+        prints.extend(bytes(db_pages * PAGE_PRINT_SIZE - len(prints)))
+        for index, fingerprint in _rewrite_pages(str(db_file), str(out_file), enc_key, dirty).items():
+            prints[index * PAGE_PRINT_SIZE : (index + 1) * PAGE_PRINT_SIZE] = fingerprint
+            restored += 1
+
+    written = 0
+    wal_file = wal_path_for(db_file)
+    if wal_file.exists():
+        result = apply_wal(wal_file, out_file, enc_key)
+        if result is not None:
+            pages, wal_db_pages = result
+            del prints[wal_db_pages * PAGE_PRINT_SIZE :]
+            prints.extend(bytes(wal_db_pages * PAGE_PRINT_SIZE - len(prints)))
+            for index in pages:
+                prints[index * PAGE_PRINT_SIZE : (index + 1) * PAGE_PRINT_SIZE] = EMPTY_PRINT
+            written = len(pages)
+    return bytes(prints), restored, written
+
+# 解压单个.db文件
+# 按固定大小的窗口流式读取输入文件，并通过复用的输出缓冲区写出，
+# 峰值内存只与 chunk_pages 有关，与数据库文件大小无关
+# max_workers > 1 且文件足够大时，按页区间拆分到多个进程并行解密
+# with_wal=True 时同时应用同目录下 -wal 文件中已提交的最新页
+# progress_callback: 接收 DecryptProgress.snapshot() 字典的进度回调
+# cancel_event: threading.Event，被设置后在页区间之间停止，返回 False
+def decrypt_wechat_db(input_path, output_path, hex_key, chunk_pages=STREAM_CHUNK_PAGES, max_workers=1,
+                      with_wal=True, progress_callback=None, cancel_event=None):
     # 1. 转换密钥
     raw_key = bytes.fromhex(hex_key)
-    
-    with open(input_path, "rb") as f:
-        data = f.read()
-    
     # 2. 获取第一页并提取 Salt (前 16 字节)
-    first_page = data[:page_size]
-    salt = first_page[:salt_size]
-    
-    # 3. 派生密钥 (PBKDF2-HMAC-SHA512)
-    # 派生加密 Key
-    enc_key = hashlib.pbkdf2_hmac("sha512", raw_key, salt, iter_count, key_size)
-    # 派生 MAC Key (Salt 异或 0x3a)
-    mac_salt = bytes([b ^ 0x3a for b in salt])
-    mac_key = hashlib.pbkdf2_hmac("sha512", enc_key, mac_salt, 2, key_size)
-
-    with open(output_path, "wb") as f_out:
-        for i in range(len(data) // page_size):
-            page_start = i * page_size
-            page_data = data[page_start : page_start + page_size]
-            
-            # 提取 IV 和 密文
-            # IV 位于预留空间的前 16 字节
-            iv = page_data[page_size - reserve_size : page_size - reserve_size + iv_size]
-            
-            # 计算需要解密的起始点
-            if i == 0:
-                # 第一页前 16 字节是 Salt，不参与解密
-                content = page_data[salt_size : page_size - reserve_size]
-            else:
-                content = page_data[: page_size - reserve_size]
-            
-            # AES-CBC 解密
-            cipher = AES.new(enc_key, AES.MODE_CBC, iv)
-            decrypted = cipher.decrypt(content)
-            
-            # 拼接回标准 SQLite 格式
-            if i == 0:
-                # 第一页写入标准头，并补齐长度
-                f_out.write(sql_file_header)
-                f_out.write(decrypted)
-                f_out.write(b"\0" * reserve_size) # 补全预留位
-            else:
-                f_out.write(decrypted)
-                f_out.write(b"\0" * reserve_size)
+    salt = read_salt(input_path)
+    # 3. 派生密钥 (PBKDF2-HMAC-SHA512)，同一进程内相同 (密钥, Salt) 只派生一次
+    enc_key, mac_key = get_derived_keys(raw_key, salt)
+    # 4. 按页解密
+    name = Path(input_path).name
+    page_size = WeChatDecryptConstants().PAGE_SIZE
+    progress = DecryptProgress({name: os.path.getsize(input_path) // page_size * page_size}, progress_callback)
+    try:
+        prints, _ = _decrypt_file(input_path, output_path, enc_key, chunk_pages, max_workers,
+                                  on_chunk=lambda n: progress.advance(name, n), cancel_event=cancel_event)
+    except DecryptCancelled:
+        print(f"⏹️  解密已取消：{input_path}")
+        return False
+    # 5. 应用 WAL 中尚未合并到 .db 的新数据
+    if with_wal:
+        _refresh_from_wal(input_path, output_path, enc_key, prints)
+    progress.finish_file(name)
 
     print(f"解密成功！输出文件：{output_path}")
+    return True
+
+# 进程池中执行的单文件任务，异常在子进程内捕获，只把结果返回给主进程
+# keys: 主进程已缓存的 (enc_key, mac_key)，为 None 时在子进程内派生
+# 成功时返回 (页指纹, 重写页数, 派生出的密钥, True)，失败返回 None
+def _decrypt_db_task(input_path, output_path, hex_key, old_prints=None, keys=None):
+    try:
+        if keys is None:
+            keys = _derive_key_task(input_path, hex_key)
+        prints, changed = _decrypt_file(input_path, output_path, keys[0], old_prints=old_prints)
+        print(f"解密成功！输出文件：{output_path}")
+        return prints, changed, keys, True
+    except Exception as e:
+        print(f"❌ 解密失败 {input_path}: {e}")
+        return None
+
+# 进程池中执行的密钥派生任务，大文件先派生密钥，再拆分为页区间任务
+def _derive_key_task(input_path, hex_key):
+    return get_derived_keys(bytes.fromhex(hex_key), read_salt(input_path))
+
+# 在当前进程内按页区间顺序解密单个文件，每个区间开始前检查取消标志
+# 返回值同 _assemble_ranges，被取消时最后一项为 False；失败返回 None
+def _decrypt_db_inline(db_file, out_file, hex_key, old_prints=None, keys=None, on_chunk=None, cancel_event=None):
+    try:
+        if keys is None:
+            keys = _derive_key_task(str(db_file), hex_key)
+        page_count = db_file.stat().st_size // WeChatDecryptConstants().PAGE_SIZE
+        ranges = _split_page_ranges(page_count)
+        _prepare_output(str(out_file), page_count, keep=old_prints is not None)
+        parts = {}
+        for start, end in ranges:
+            if _cancelled(cancel_event):
+                break
+            parts[start] = _decrypt_page_range(str(db_file), str(out_file), keys[0], start, end,
+                                               STREAM_CHUNK_PAGES, _slice_prints(old_prints, start, end), on_chunk)
+        return _assemble_ranges(parts, ranges, old_prints, keys)
+    except Exception as e:
+        print(f"❌ 解密失败 {db_file}: {e}")
+        return None
+
+# 在共享进程池中调度所有文件：小文件整体作为一个任务，
+# 大文件先派生密钥（已缓存则跳过），再把各个页区间作为独立任务写到预分配的输出文件中
+# 每个文件结束时调用 on_file_done(db_file, out_file, 结果)，结果同 _assemble_ranges，失败为 None
+# cancel_event 被设置后取消尚未开始的任务，已开始的区间会执行完，部分完成的文件以未完成状态回调
+def _decrypt_files_on_pool(tasks, hex_key, max_workers, old_prints, known_keys, on_file_done,
+                           progress=None, cancel_event=None):
+    page_size = WeChatDecryptConstants().PAGE_SIZE
+    range_parts = {}
+    file_ranges = {}
+    file_keys = {}
+    failed = set()
+    pending = {}
+
+    def submit_ranges(executor, db_file, out_file, keys):
+        file_prints = old_prints.get(db_file)
+        page_count = db_file.stat().st_size // page_size
+        _prepare_output(str(out_file), page_count, keep=file_prints is not None)
+        range_parts[db_file] = {}
+        file_ranges[db_file] = _split_page_ranges(page_count)
+        file_keys[db_file] = keys
+        for range_start, range_end in file_ranges[db_file]:
+            range_future = executor.submit(
+                _decrypt_page_range, str(db_file), str(out_file), keys[0], range_start, range_end,
+                STREAM_CHUNK_PAGES, _slice_prints(file_prints, range_start, range_end)
+            )
+            pending[range_future] = ("range", db_file, out_file, (range_start, range_end))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for db_file, out_file in tasks:
+            page_count = db_file.stat().st_size // page_size
+            keys = known_keys.get(db_file)
+            if len(_split_page_ranges(page_count)) <= 2:
+                future = executor.submit(_decrypt_db_task, str(db_file), str(out_file), hex_key,
+                                         old_prints.get(db_file), keys)
+                pending[future] = ("file", db_file, out_file, None)
+            elif keys is None:
+                future = executor.submit(_derive_key_task, str(db_file), hex_key)
+                pending[future] = ("key", db_file, out_file, None)
+            else:
+                submit_ranges(executor, db_file, out_file, keys)
+
+        cancelled = False
+        while pending:
+            if not cancelled and _cancelled(cancel_event):
+                # 只能取消尚未开始的任务，正在执行的区间很快就会结束
+                cancelled = True
+                for future in pending:
+                    future.cancel()
+            # 定时醒来检查取消标志
+            done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, db_file, out_file, page_range = pending.pop(future)
+                if future.cancelled():
+                    value = None
+                else:
+                    try:
+                        value = future.result()
+                    except Exception as e:
+                        # 子进程异常退出（如被系统杀死）时 future 本身会抛出异常
+                        print(f"❌ 解密失败 {db_file}: {e}")
+                        value = None
+                if kind == "file":
+                    if not future.cancelled():
+                        on_file_done(db_file, out_file, value)
+                elif kind == "key":
+                    if value is None:
+                        if not future.cancelled():
+                            on_file_done(db_file, out_file, None)
+                    elif not cancelled:
+                        submit_ranges(executor, db_file, out_file, value)
+                else:
+                    if value is not None:
+                        range_parts[db_file][page_range[0]] = value
+                        if progress is not None:
+                            progress.advance(db_file.name, (page_range[1] - page_range[0]) * page_size)
+                    elif not future.cancelled():
+                        failed.add(db_file)
+                    if any(p[1] == db_file for p in pending.values()):
+                        continue
+                    # 该文件的所有分段都已结束，按顺序拼接指纹
+                    if db_file in failed:
+                        on_file_done(db_file, out_file, None)
+                        continue
+                    result = _assemble_ranges(range_parts.pop(db_file), file_ranges[db_file],
+                                              old_prints.get(db_file), file_keys[db_file])
+                    if result[3]:
+                        print(f"解密成功！输出文件：{out_file}")
+                    on_file_done(db_file, out_file, result)
 
 # 解压所有的.db文件
-def decrypt_all_db(db_dir, output_dir, hex_key) -> bool:
+# max_workers: 进程池大小，None 表示使用全部 CPU 核心，1 表示在当前进程内顺序解密
+# persist_keys: 是否把派生出的密钥加密保存到输出目录，下次启动后跳过 PBKDF2
+# profile / include / exclude / priority: 选择需要解密的数据库及其顺序，见 core/db_selection.py
+# progress_callback: 接收 DecryptProgress.snapshot() 字典的进度回调（字节数、页/秒、预计剩余时间）
+# cancel_event: threading.Event，被设置后尽快停止；已完成的文件与页区间记入清单，下次运行从中断处继续
+# build_message_store: 解密后把消息增量导入合并消息库（见 core/message_store.py）
+# build_message_search: 同时更新合并消息库上的全文索引（见 core/message_search.py）
+# build_contact_stats: 解密后重新统计每个好友的消息数、最近联系时间等（见 core/contact_stats.py），需要提供 my_wxid
+def decrypt_all_db(db_dir, output_dir, hex_key, max_workers=None, persist_keys=False,
+                   profile=None, include=None, exclude=None, priority=None,
+                   progress_callback=None, cancel_event=None, build_message_store=False,
+                   build_message_search=False, build_contact_stats=False, my_wxid=None) -> bool:
     base_path = Path(db_dir)
     output_path = Path(output_dir)
-    
+
     if not base_path.exists():
         print(f"❌ 错误：目录不存在 - {db_dir}")
         return False
-    
+
     output_path.mkdir(exist_ok=True)
-    
+
     db_paths = list(base_path.rglob("*.db"))
     db_paths = [f for f in db_paths if f.name.endswith(('.db'))]
-    
+    # 只保留需要的数据库，并按优先级排序（如 contact.db 最先完成，搜索可以尽早使用）
+    db_paths = select_db_files(db_paths, base_path, profile=profile, include=include,
+                               exclude=exclude, priority=priority)
+
     output_paths = []
     for path in db_paths:
         last_name = path.stem
         out_file = output_path / f"{last_name}.sqlite"
         output_paths.append(out_file)
-    
+
 
     if len(db_paths) == 0:
         print(f"⚠️  未找到任何 .db 文件")
         return False
     print(f"📁 找到 {len(db_paths)} 个数据库文件")
-    
-    for i in range(len(db_paths)):
-        db_file = db_paths[i]
-        out_file = output_paths[i]
-        decrypt_wechat_db(str(db_file), str(out_file), hex_key)
-    return True
-    
+
+    # 先用最小的数据库校验密钥，密钥错误时立即失败，不写出任何文件
+    page_size = WeChatDecryptConstants().PAGE_SIZE
+    # 空文件或不足一页的文件无法校验，跳过它们选择最小的完整数据库
+    probe_db = find_probe_db(base_path, db_paths)
+    if probe_db is not None and not verify_key(probe_db, hex_key):
+        print(f"❌ 错误：密钥校验失败（{probe_db.name} 第一页 HMAC 不匹配），请检查 decryption_key")
+        return False
+
+    # 连接池中的只读连接（含内存映射）会阻止在 Windows 上改写解密结果，先全部关闭
+    close_pooled_connections()
+
+    # 对比清单，跳过源文件与输出都未变化的数据库，其余文件只重写变化的页
+    # 上次被取消的文件在清单中标记为未完成，这次只重做未完成的页区间
+    manifest = DecryptManifest(output_path, hex_key)
+    # .db 未变化但 -wal 有变化的文件只需要重新应用 WAL
+    tasks = []
+    wal_only = []
+    src_stats = {}
+    wal_stats = {}
+    old_prints = {}
+    skipped = []
+    for db_file, out_file in zip(db_paths, output_paths):
+        src_stats[db_file] = db_file.stat()
+        wal_file = wal_path_for(db_file)
+        wal_stats[db_file] = wal_file.stat() if wal_file.exists() else None
+        old_prints[db_file] = manifest.old_prints(out_file.name, out_file)
+        if manifest.is_unchanged(out_file.name, src_stats[db_file], out_file):
+            if manifest.wal_unchanged(out_file.name, wal_stats[db_file]):
+                skipped.append(db_file)
+            else:
+                wal_only.append((db_file, out_file))
+            continue
+        tasks.append((db_file, out_file))
+    if skipped:
+        print(f"⏭️  {len(skipped)} 个数据库未变化，跳过")
+
+    # 派生密钥只与 (密钥, Salt) 有关，先在主进程查缓存，命中的文件不再重复派生
+    raw_key = bytes.fromhex(hex_key)
+    salts = {db_file: read_salt(db_file) for db_file, _ in tasks + wal_only}
+    if persist_keys and salts:
+        load_key_cache(output_path, raw_key, set(salts.values()))
+    known_keys = {}
+    for db_file, salt in salts.items():
+        keys = cached_keys(raw_key, salt)
+        if keys is not None:
+            known_keys[db_file] = keys
+
+    # 进度按需要扫描的页字节数统计，只需重新应用 WAL 的文件不计字节
+    sizes = {db_file.name: src_stats[db_file].st_size // page_size * page_size for db_file, _ in tasks}
+    sizes.update({db_file.name: 0 for db_file, _ in wal_only})
+    progress = DecryptProgress(sizes, progress_callback)
+
+    succeeded = []
+    partial = []
+    failed = []
+
+    # 每个文件结束后立即应用 WAL 并保存清单，中途取消或崩溃时已完成的文件不会重做
+    def finish(db_file, out_file, result, restore=False):
+        try:
+            if restore:
+                keys = get_derived_keys(raw_key, salts[db_file])
+                prints, changed, wal_pages = _refresh_from_wal(
+                    db_file, out_file, keys[0], old_prints[db_file], restore=True
+                )
+            else:
+                if result is None:
+                    raise RuntimeError("页解密失败")
+                prints, changed, keys, complete = result
+                remember_keys(raw_key, salts[db_file], keys)
+                if not complete:
+                    # 未完成的文件不应用 WAL，记下已完成区间的指纹，下次从这里继续
+                    manifest.record(out_file.name, src_stats[db_file], prints, complete=False)
+                    manifest.save()
+                    partial.append(db_file)
+                    print(f"⏸️  {db_file.name} 已中断（本次重写 {changed} 页），下次解密时继续")
+                    return
+                prints, _, wal_pages = _refresh_from_wal(db_file, out_file, keys[0], prints)
+        except Exception as e:
+            failed.append(db_file)
+            manifest.forget(out_file.name)
+            manifest.save()
+            print(f"❌ {db_file.name}: {e}")
+            return
+        manifest.record(out_file.name, src_stats[db_file], prints, wal_stat=wal_stats[db_file])
+        manifest.save()
+        succeeded.append(db_file)
+        progress.finish_file(db_file.name)
+        print(f"✅ {db_file.name}（重写 {changed}/{len(prints) // PAGE_PRINT_SIZE} 页，WAL {wal_pages} 页）")
+
+    # tasks 保持 select_db_files 给出的顺序：优先级高的先调度，同一优先级内按文件大小降序，
+    # 最大的文件最先开始，总耗时接近最大文件的解密时间
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, int(max_workers))
+
+    if max_workers == 1 or not tasks:
+        for db_file, out_file in tasks:
+            if _cancelled(cancel_event):
+                break
+            finish(db_file, out_file, _decrypt_db_inline(
+                db_file, out_file, hex_key, old_prints[db_file], known_keys.get(db_file),
+                on_chunk=lambda n, name=db_file.name: progress.advance(name, n), cancel_event=cancel_event
+            ))
+    else:
+        _decrypt_files_on_pool(tasks, hex_key, max_workers, old_prints, known_keys, finish,
+                               progress, cancel_event)
+
+    for db_file, out_file in wal_only:
+        if _cancelled(cancel_event):
+            break
+        finish(db_file, out_file, None, restore=True)
+
+    # 更新消息表位置索引，只会重新扫描内容变化过的消息库
+    message_outputs = [p for p in output_paths if fnmatch(p.name, f"{MSG_DB_PATTERN}.sqlite") and p.exists()]
+    if message_outputs and not _cancelled(cancel_event):
+        try:
+            build_msg_table_index(output_path, message_outputs)
+        except Exception as e:
+            print(f"⚠️  消息表索引更新失败: {e}")
+        # 可选：把所有分库的消息增量导入到带索引的合并消息库 messages.sqlite，全文索引建立在合并消息库之上
+        if (build_message_store or build_message_search) and not failed:
+            try:
+                added = update_message_store(output_path, message_outputs)
+                print(f"🗃️  合并消息库新增 {added} 条消息")
+                if build_message_search:
+                    print(f"🔎 全文索引新增 {update_message_fts(output_path)} 条消息")
+            except Exception as e:
+                print(f"⚠️  合并消息库更新失败: {e}")
+        # 可选：按分库一次性统计每个好友的互动数据，供好友列表排序筛选
+        if build_contact_stats and my_wxid and not failed:
+            try:
+                counted = update_contact_stats(output_path, message_outputs, my_wxid)
+                if counted >= 0:
+                    print(f"📈 已统计 {counted} 个好友的聊天数据")
+            except Exception as e:
+                print(f"⚠️  好友统计更新失败: {e}")
+
+    if persist_keys and salts and not save_key_cache(output_path):
+        print("⚠️  当前系统不支持 DPAPI，派生密钥不会保存到磁盘")
+    cancelled = _cancelled(cancel_event)
+    not_started = len(tasks) + len(wal_only) - len(succeeded) - len(partial) - len(failed)
+    summary = f"成功 {len(succeeded)} 个，跳过 {len(skipped)} 个，失败 {len(failed)} 个"
+    if cancelled:
+        print(f"⏹️  解密已取消：{summary}，未完成 {len(partial) + not_started} 个")
+    else:
+        print(f"📊 解密完成：{summary}")
+    return not failed and not cancelled
+
 # 使用示例
 if __name__ == "__main__":
     MY_HEX_KEY = ""
     DB_DIR = ""
     OUT_DIR = ""
     decrypt_all_db(DB_DIR, OUT_DIR, MY_HEX_KEY)
-    
\ No newline at end of file
+
@@ -0,0 +1,156 @@
+"""Read-only SQLite VFS that decrypts WeChat databases on demand.
+
+Pages are decrypted when SQLite reads them and kept in an LRU cache; committed
+``-wal`` frames are overlaid. Requires the optional apsw package.
+"""
+
+from __future__ import annotations
+
+import os
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+
+try:
+    import apsw
+except ImportError:  # apsw 是可选依赖，缺失时只能使用解密后的 sqlite 副本
+    apsw = None
+
+from core.key_cache import get_derived_keys
+from core.utils.page_cipher import decrypt_page
+from core.utils.wechat_constants import WeChatDecryptConstants
+from core.wal_decrypt import read_committed_frames, wal_path_for
+
+VFS_AVAILABLE = apsw is not None
+VFS_NAME = "wxcrypt"
+# 每个连接默认缓存的明文页数（2048 页 * 4096 字节 = 8MB）
+DEFAULT_CACHE_PAGES = 2048
+
+# 文件名 -> (enc_key, 缓存页数)，在打开连接前登记，VFS 打开主库时取用
+_registry = {}
+_registry_lock = Lock()
+_vfs = None
+
+
+def _norm(path) -> str:
+    return os.path.normcase(os.path.abspath(str(path)))
+
+
+if VFS_AVAILABLE:
+
+    class _EncryptedDbFile(apsw.VFSFile):
+        """Main database file: raw I/O goes to the default VFS, pages are decrypted on read."""
+
+        def __init__(self, name, flags, enc_key: bytes, cache_pages: int) -> None:
+            super().__init__("", name, flags)
+            self._path = name.filename() if isinstance(name, apsw.URIFilename) else name
+            self._enc_key = enc_key
+            self._page_size = WeChatDecryptConstants().PAGE_SIZE
+            self._cache = OrderedDict()
+            self._cache_pages = max(1, cache_pages)
+            self._lock = Lock()
+            # WAL 中已提交的页覆盖主库中的同一页，提交时的页数决定数据库长度
+            self._wal_path = wal_path_for(Path(self._path))
+            self._wal_frames = {}
+            self._size = super().xFileSize() // self._page_size * self._page_size
+            if self._wal_path.exists():
+                frames, db_pages = read_committed_frames(self._wal_path)
+                if db_pages:
+                    self._wal_frames = frames
+                    self._size = db_pages * self._page_size
+
+        def _load_page(self, index: int) -> bytes:
+            offset = self._wal_frames.get(index)
+            if offset is not None:
+                with open(self._wal_path, "rb") as f:
+                    f.seek(offset)
+                    raw = f.read(self._page_size)
+            else:
+                raw = super().xRead(self._page_size, index * self._page_size)
+            page = decrypt_page(self._enc_key, raw, index)
+            if index == 0:
+                # 文件头第 18/19 字节改为回滚日志模式，WAL 已由本 VFS 合并，SQLite 不再查找 -wal/-shm
+                page[18] = 1
+                page[19] = 1
+            return bytes(page)
+
+        def _page(self, index: int) -> bytes:
+            with self._lock:
+                page = self._cache.get(index)
+                if page is not None:
+                    self._cache.move_to_end(index)
+                    return page
+            page = self._load_page(index)
+            with self._lock:
+                self._cache[index] = page
+                if len(self._cache) > self._cache_pages:
+                    self._cache.popitem(last=False)
+            return page
+
+        def xRead(self, amount: int, offset: int) -> bytes:
+            end = min(offset + amount, self._size)
+            if offset >= end:
+                return b""
+            first = offset // self._page_size
+            last = (end - 1) // self._page_size
+            data = b"".join(self._page(i) for i in range(first, last + 1))
+            start = offset - first * self._page_size
+            return data[start : start + (end - offset)]
+
+        def xFileSize(self) -> int:
+            return self._size
+
+        def xWrite(self, data, offset: int) -> None:
+            raise apsw.ReadOnlyError("加密数据库只读")
+
+        def xTruncate(self, newsize: int) -> None:
+            raise apsw.ReadOnlyError("加密数据库只读")
+
+    class _EncryptedVFS(apsw.VFS):
+        def __init__(self) -> None:
+            super().__init__(VFS_NAME, "")
+
+        def xOpen(self, name, flags):
+            filename = name.filename() if isinstance(name, apsw.URIFilename) else name
+            entry = None
+            if filename and flags[0] & apsw.mapping_open_flags["SQLITE_OPEN_MAIN_DB"]:
+                with _registry_lock:
+                    entry = _registry.get(_norm(filename))
+            if entry is None:
+                return apsw.VFSFile("", name, flags)
+            return _EncryptedDbFile(name, flags, *entry)
+
+
+def _ensure_vfs() -> None:
+    global _vfs
+    if not VFS_AVAILABLE:
+        raise RuntimeError("未安装 apsw，无法直接读取加密数据库")
+    with _registry_lock:
+        if _vfs is None:
+            _vfs = _EncryptedVFS()
+
+
+def _dict_row(cursor, row):
+    return dict(zip((d[0] for d in cursor.get_description()), row))
+
+
+def open_encrypted_db(db_path, hex_key: str, cache_pages: int = DEFAULT_CACHE_PAGES):
+    """Open an encrypted WeChat ``.db`` read-only; rows come back as dicts."""
+    _ensure_vfs()
+    path = Path(db_path).resolve()
+    with open(path, "rb") as f:
+        salt = f.read(WeChatDecryptConstants().SALT_SIZE)
+    enc_key, _ = get_derived_keys(bytes.fromhex(hex_key), salt)
+    with _registry_lock:
+        _registry[_norm(path)] = (enc_key, cache_pages)
+    flags = apsw.SQLITE_OPEN_READONLY | apsw.SQLITE_OPEN_URI
+    conn = apsw.Connection(f"{path.as_uri()}?immutable=1", flags=flags, vfs=VFS_NAME)
+    conn.row_trace = _dict_row
+    return conn
+
+
+def db_errors() -> tuple:
+    """Exception types raised by connections from this module and from sqlite3."""
+    import sqlite3
+
+    return (sqlite3.Error, apsw.Error) if VFS_AVAILABLE else (sqlite3.Error,)
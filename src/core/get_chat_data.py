@@ -1,14 +1,57 @@
 # 基于wxid获得和一个人的文字聊天记录
-import sqlite3
 import zstandard as zstd
+import heapq
 import os
+from itertools import islice
+from core.db_connect import DB_ERRORS, acquire_db, release_db
+from core.msg_table_index import get_msg_table_index
+from core.name2id_cache import get_sender_names, resolve_sender
 from core.utils.str2md5 import str2md5
 from core.utils.message import Message
 
+# 每批读取的消息条数
+MSG_BATCH_SIZE = 500
+# Zstd 压缩帧的魔法数字
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# 把类型集合与时间范围转换为 WHERE 条件，返回 (条件列表, 参数列表)
+def build_msg_filters(filter_set=None, start_time=None, end_time=None):
+    conditions = []
+    params = []
+    if filter_set:
+        types = sorted(filter_set)
+        conditions.append(f"local_type IN ({', '.join(['?'] * len(types))})")
+        params.extend(types)
+    if start_time is not None:
+        conditions.append("create_time >= ?")
+        params.append(int(start_time))
+    if end_time is not None:
+        conditions.append("create_time < ?")
+        params.append(int(end_time))
+    return conditions, params
+
+# 生成消息查询语句：类型、时间范围与条数限制都交给 SQLite 处理，只读取需要的行
+# 返回 (sql, 参数)
+def build_msg_query(target_table, filter_set=None, limit=None, start_time=None, end_time=None):
+    conditions, params = build_msg_filters(filter_set, start_time, end_time)
+    query = f"SELECT local_type, real_sender_id, create_time, message_content FROM {target_table}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY create_time DESC"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(int(limit))
+    return query, tuple(params)
+
 # dbs_paths: 解密后的message数据库文件路径列表
 # wxid: 目标微信 ID
-# filter_set: 选择保留的消息类型 filter_type = 1 文字消息
-def single_user_all_msg(dbs_paths, wxid, filter_set):
+# filter_set: 选择保留的消息类型 filter_type = 1 文字消息，为空时不过滤
+# hex_key: 传入时 dbs_paths 为加密的 message_N.db，直接解密读取
+# index_dir: 消息表位置索引的保存目录，默认为解密库所在的缓存目录（直接读取加密库时不落盘）
+# limit: 最多返回的消息条数（按时间从新到旧），None 表示不限制
+# start_time / end_time: 只返回 create_time 在 [start_time, end_time) 内的消息（秒级时间戳）
+def single_user_all_msg(dbs_paths, wxid, filter_set, hex_key=None, index_dir=None,
+                        limit=None, start_time=None, end_time=None):
     ################################
     # 找到目标表
     # 1. 生成目标表名
@@ -18,87 +61,120 @@ def single_user_all_msg(dbs_paths, wxid, filter_set):
     print(f"[*] 目标微信 ID: {wxid}")
     print(f"[*] 对应 MD5 表名: {target_table}")
 
-    found_db = None
-
-    # 2. 遍历所有数据库搜索该表
+    # 2. 通过位置索引查找含有该表的所有数据库，只有文件变化过的数据库才会重新扫描 sqlite_master
     for db_path in dbs_paths:
         assert os.path.exists(db_path), f"数据库文件 {db_path} 不存在"
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # 查询 sqlite_master 表确认该表是否存在
-        check_query = "SELECT name FROM sqlite_master WHERE type='table' AND name=?"
-        cursor.execute(check_query, (target_table,))
-        
-        if cursor.fetchone():
-            print(f"[+] 在数据库 {db_path} 中找到了表 {target_table}!")
-            found_db = db_path
-            conn.close()
-            break
-        conn.close()
+    found_dbs = _locate_msg_dbs(dbs_paths, wxid, hex_key, index_dir)
+    for found_db in found_dbs:
+        print(f"[+] 在数据库 {found_db} 中找到了表 {target_table}!")
 
-    if not found_db:
+    if not found_dbs:
         print("[-] 错误：在所有提供的数据库中均未找到和{}的聊天记录。".format(wxid))
-        exit()
+        return []
     ###################################
-    # 读取数据
-    # 1 连接数据库
-    conn = sqlite3.connect(found_db)
-    conn.row_factory = sqlite3.Row
+    # 读取数据：分批读取、解压并转换发送者，多个分库按时间归并后收集为列表
+    return list(_merge_shards(found_dbs, target_table, hex_key, filter_set, limit, start_time, end_time))
+
+# 与 single_user_all_msg 参数相同的生成器版本，按批（batch_size 条）读取并逐条产出 Message
+# 只在需要时读取下一批，峰值内存与 batch_size 有关，与聊天记录总量无关；未找到聊天表时不产出任何消息
+def iter_user_msgs(dbs_paths, wxid, filter_set=None, hex_key=None, index_dir=None,
+                   limit=None, start_time=None, end_time=None, batch_size=MSG_BATCH_SIZE):
+    found_dbs = _locate_msg_dbs(dbs_paths, wxid, hex_key, index_dir)
+    target_table = f"Msg_{str2md5(wxid)}"
+    yield from _merge_shards(found_dbs, target_table, hex_key, filter_set, limit, start_time, end_time,
+                             batch_size)
+
+# 含有该好友聊天表的所有数据库，保持 dbs_paths 中的顺序
+def _locate_msg_dbs(dbs_paths, wxid, hex_key=None, index_dir=None):
+    if index_dir is None and not hex_key and dbs_paths:
+        index_dir = os.path.dirname(os.path.abspath(dbs_paths[0]))
+    return get_msg_table_index(index_dir).locate(wxid, dbs_paths, hex_key)
+
+# 微信把聊天记录分散在 message_0..N 多个分库中，同一好友的表可能出现在多个分库里
+# 每个分库各自按时间倒序读取（同样带 LIMIT），再用堆按 create_time 归并，
+# 取满 limit 条后立即停止，其余分库只读取过第一批
+def _merge_shards(db_paths, target_table, hex_key, filter_set=None, limit=None, start_time=None, end_time=None,
+                  batch_size=MSG_BATCH_SIZE):
+    if limit is not None:
+        batch_size = max(1, min(batch_size, int(limit)))
+    shards = [
+        _iter_table_msgs(db_path, target_table, hex_key, filter_set, limit, start_time, end_time, batch_size)
+        for db_path in db_paths
+    ]
+    try:
+        if len(shards) == 1:
+            merged = shards[0]
+        else:
+            merged = heapq.merge(*shards, key=lambda msg: msg.create_time, reverse=True)
+        yield from islice(merged, limit)
+    finally:
+        # 提前停止时关闭各分库的生成器，把连接归还连接池
+        for shard in shards:
+            shard.close()
+
+# 从单个数据库的消息表中按时间从新到旧分批读取消息
+def _iter_table_msgs(db_path, target_table, hex_key, filter_set=None, limit=None, start_time=None, end_time=None,
+                     batch_size=MSG_BATCH_SIZE):
+    # 从共享连接池借出只读连接，生成器结束或被关闭时归还
+    conn = acquire_db(db_path, hex_key)
     cursor = conn.cursor() # 创建游标对象
-    # 2 查询并返回所有消息
-    message_list = []
+    # real_sender_id -> wxid，按 rowid 下标的缓存列表，读到第一批消息时才加载
+    sender_names = None
+    dctx = zstd.ZstdDecompressor()
     try:
-        # 2.1 查询消息列表，并获得对应消息内容
         # int int int str/binary
-        query = f"SELECT local_type, real_sender_id, create_time, message_content FROM {target_table} ORDER BY create_time DESC"
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        id_set = set()
-        # 部分消息内容是经过 Zstd 压缩的二进制数据，解压后才是文本内容
-        dctx = zstd.ZstdDecompressor()
-        for row in rows:
-            # 只保留特定信息
-            if row['local_type'] not in filter_set:
-                continue
-            content = row['message_content']
-            if content and type(content) == bytes:
-                if content.startswith(b'\x28\xb5\x2f\xfd'): # Zstd 魔法数字
-                    try:
-                        content = dctx.decompress(content)
-                    except zstd.ZstdError as e:
-                        print(f"[-] 内容以Zstd 魔法数字，但Zstd 解压失败: {e}")
-                else:
-                    print(f"[!] 警告：消息内容是二进制数据，但不以Zstd 魔法数字开头，无法正确解压。")
-                    print(f"消息前8字节: {content[:8].hex()}")
-                    # 尝试直接解码为文本（如果不是压缩数据，可能是纯文本或其他格式）
-                    try:
-                        content = content.decode('utf-8', errors='ignore')
-                    except:
-                        pass
-            message_list.append(Message(
-                message_content=content,
-                create_time=row['create_time'],
-                sender_name=row['real_sender_id']
-            ))
-            id_set.add(row['real_sender_id'])
-        # 2.2 把local_id转换为发送者wxid
-        placeholders = ', '.join(['?'] * len(id_set))
-        # 显式查询 rowid，因为它默认不包含在 SELECT * 中
-        query = f"SELECT rowid, * FROM Name2Id WHERE rowid IN ({placeholders})"
-        cursor.execute(query, tuple(id_set))
-        rows = cursor.fetchall()
-
-        localid_to_wxid = {row['rowid']: row['user_name'] for row in rows}
-        for msg in message_list:
-            if msg.sender_name in localid_to_wxid:
-                msg.sender_name = localid_to_wxid[msg.sender_name]
-        
-    except sqlite3.Error as e:
+        query, params = build_msg_query(target_table, filter_set, limit, start_time, end_time)
+        cursor.execute(query, params)
+        while True:
+            rows = list(islice(cursor, batch_size))
+            if not rows:
+                break
+            contents = decode_contents([row['message_content'] for row in rows], dctx)
+            if sender_names is None:
+                sender_names = get_sender_names(db_path, hex_key)
+            for row, content in zip(rows, contents):
+                sender_id = row['real_sender_id']
+                yield Message(
+                    message_content=content,
+                    create_time=row['create_time'],
+                    sender_name=resolve_sender(sender_names, sender_id)
+                )
+    except DB_ERRORS as e:
         print(f"[-] 数据库操作失败: {e}")
     finally:
-        conn.close()
-    return message_list
+        cursor.close()
+        release_db(conn)
+
+# 解码一批消息内容：部分消息内容是经过 Zstd 压缩的二进制数据，解压后才是文本内容
+# 整批压缩内容先尝试一次性多线程解压，帧头缺少原始大小等情况下退回逐条解压
+def decode_contents(contents, dctx):
+    contents = list(contents)
+    frames = []
+    for i, content in enumerate(contents):
+        if not content or type(content) != bytes:
+            continue
+        if content.startswith(ZSTD_MAGIC):
+            frames.append(i)
+            continue
+        print(f"[!] 警告：消息内容是二进制数据，但不以Zstd 魔法数字开头，无法正确解压。")
+        print(f"消息前8字节: {content[:8].hex()}")
+        # 尝试直接解码为文本（如果不是压缩数据，可能是纯文本或其他格式）
+        contents[i] = content.decode('utf-8', errors='ignore')
+    if len(frames) > 1:
+        try:
+            buffers = dctx.multi_decompress_to_buffer([contents[i] for i in frames], threads=-1)
+            for i, buffer in zip(frames, buffers):
+                contents[i] = buffer.tobytes()
+            return contents
+        except (zstd.ZstdError, ValueError):
+            pass
+    for i in frames:
+        try:
+            # 流式解压不依赖帧头中的原始大小
+            contents[i] = dctx.decompressobj().decompress(contents[i])
+        except zstd.ZstdError as e:
+            print(f"[-] 内容以Zstd 魔法数字，但Zstd 解压失败: {e}")
+    return contents
 
 # ================= 配置区 =================
     
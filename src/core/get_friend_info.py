@@ -1,16 +1,20 @@
 # 基于wxid获得一个人的基本信息
-import sqlite3
+from core.db_connect import DB_ERRORS, acquire_db, release_db
 from core.utils.friend_info import FriendInfo
-def single_user_info(db_path, wxid):
+# hex_key：传入时 db_path 为加密的 contact.db，直接解密读取
+def single_user_info(db_path, wxid, hex_key=None):
     ###################################
     # 读取数据
     # 1 连接数据库
     TARGET_TABLE = "Contact"
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
+    # 从共享连接池借出只读连接，用完归还，不再每次重新打开数据库
+    conn = acquire_db(db_path, hex_key)
     cursor = conn.cursor() # 创建游标对象
+    # 查询失败时返回 None
+    info = None
     try:
-        query = f"SELECT * FROM {TARGET_TABLE} WHERE username = ?"
+        # 只查询生成提示词需要的列
+        query = f"SELECT username, alias, remark, description FROM {TARGET_TABLE} WHERE username = ?"
         
         # 执行查询，传入目标微信 ID
         cursor.execute(query, (wxid,))
@@ -20,17 +24,16 @@ def single_user_info(db_path, wxid):
             print(f"[-] 错误：在数据库中未找到微信 ID {wxid} 的用户信息。")
             return None
         
-        row = dict(row)
         info = FriendInfo(
             wxid=row["username"],
             alias=row["alias"],
             remark_name=row["remark"],
             description=row["description"]
         )
-    except sqlite3.Error as e:
+    except DB_ERRORS as e:
         print(f"[-] 数据库操作失败: {e}")
     finally:
-        conn.close()
+        release_db(conn)
     return info
 
 if __name__ == "__main__":
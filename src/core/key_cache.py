@@ -0,0 +1,112 @@
+"""Cache of PBKDF2-derived database keys, keyed by (raw key, salt).
+
+Kept in memory per process; optionally persisted to the cache directory,
+protected with Windows DPAPI.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from threading import Lock
+from typing import Optional, Tuple
+
+from core.utils.wechat_constants import WeChatDecryptConstants
+
+KEY_CACHE_NAME = "derived_keys.bin"
+_DPAPI_ENTROPY = b"wechat-wish-derived-keys"
+
+DerivedKeys = Tuple[bytes, bytes]
+
+_memory = {}
+_lock = Lock()
+
+
+def derive_keys(raw_key: bytes, salt: bytes) -> DerivedKeys:
+    """Run the SQLCipher key derivation and return (enc_key, mac_key)."""
+    constants = WeChatDecryptConstants()
+    # PBKDF2-HMAC-SHA512 派生加密 Key
+    enc_key = hashlib.pbkdf2_hmac("sha512", raw_key, salt, constants.ITER_COUNT, constants.KEY_SIZE)
+    # 派生 MAC Key (Salt 异或 0x3a)
+    mac_salt = bytes([b ^ 0x3a for b in salt])
+    mac_key = hashlib.pbkdf2_hmac("sha512", enc_key, mac_salt, 2, constants.KEY_SIZE)
+    return enc_key, mac_key
+
+
+def cached_keys(raw_key: bytes, salt: bytes) -> Optional[DerivedKeys]:
+    with _lock:
+        return _memory.get((raw_key, salt))
+
+
+def remember_keys(raw_key: bytes, salt: bytes, keys: DerivedKeys) -> None:
+    with _lock:
+        _memory[(raw_key, salt)] = keys
+
+
+def get_derived_keys(raw_key: bytes, salt: bytes) -> DerivedKeys:
+    """Return cached keys for (raw_key, salt), deriving them on a miss."""
+    keys = cached_keys(raw_key, salt)
+    if keys is None:
+        keys = derive_keys(raw_key, salt)
+        remember_keys(raw_key, salt, keys)
+    return keys
+
+
+def _entry_id(raw_key: bytes, salt: bytes) -> str:
+    return hashlib.sha256(raw_key + salt).hexdigest()
+
+
+def _protect(data: bytes) -> Optional[bytes]:
+    try:
+        import win32crypt
+    except ImportError:
+        return None
+    return win32crypt.CryptProtectData(data, "wish-client", _DPAPI_ENTROPY, None, None, 0)
+
+
+def _unprotect(blob: bytes) -> Optional[bytes]:
+    try:
+        import win32crypt
+    except ImportError:
+        return None
+    _, data = win32crypt.CryptUnprotectData(blob, _DPAPI_ENTROPY, None, None, 0)
+    return data
+
+
+def load_key_cache(cache_dir: Path, raw_key: bytes, salts) -> int:
+    """Merge persisted keys for the given salts into memory; return how many were loaded."""
+    path = Path(cache_dir) / KEY_CACHE_NAME
+    if not path.exists():
+        return 0
+    try:
+        data = _unprotect(path.read_bytes())
+        entries = json.loads(data) if data else {}
+    except Exception as e:
+        print(f"[-] 读取密钥缓存失败: {e}")
+        return 0
+    loaded = 0
+    for salt in salts:
+        entry = entries.get(_entry_id(raw_key, salt))
+        if entry:
+            remember_keys(raw_key, salt, (bytes.fromhex(entry[0]), bytes.fromhex(entry[1])))
+            loaded += 1
+    return loaded
+
+
+def save_key_cache(cache_dir: Path) -> bool:
+    """Persist every key derived in this process; returns False when DPAPI is unavailable."""
+    with _lock:
+        entries = {
+            _entry_id(raw_key, salt): [keys[0].hex(), keys[1].hex()]
+            for (raw_key, salt), keys in _memory.items()
+        }
+    blob = _protect(json.dumps(entries).encode("utf-8"))
+    if blob is None:
+        return False
+    path = Path(cache_dir) / KEY_CACHE_NAME
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_bytes(blob)
+    os.replace(tmp_path, path)
+    return True
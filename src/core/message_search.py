@@ -0,0 +1,144 @@
+"""Full-text search over the consolidated message store.
+
+A trigram FTS5 index answers queries of 3+ characters, a unigram/bigram index
+answers 1-2 characters; short queries with whitespace fall back to LIKE.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from itertools import islice
+from typing import List, Optional, Tuple
+
+from core.db_connect import DB_ERRORS, acquire_db, close_pooled_connections, release_db
+from core.get_chat_data import MSG_BATCH_SIZE, build_msg_filters
+from core.message_store import message_store_path
+from core.utils.message import Message
+from core.utils.str2md5 import str2md5
+
+FTS_TABLE = "messages_fts"
+# 1~2 个字的查询使用的单字 / 双字索引
+NGRAM_TABLE = "messages_ngram"
+# trigram 分词器至少需要 3 个字符才能匹配
+MIN_FTS_QUERY_LEN = 3
+
+_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+    USING fts5(content, content='messages', content_rowid='id', tokenize='trigram');
+CREATE VIRTUAL TABLE IF NOT EXISTS {NGRAM_TABLE} USING fts5(grams, content='', tokenize='ascii');
+CREATE TABLE IF NOT EXISTS fts_state(id INTEGER PRIMARY KEY CHECK (id = 0), last_message_id INTEGER NOT NULL);
+"""
+
+
+def _gram_token(gram: str) -> str:
+    # 十六进制编码后只含字母数字，ascii 分词器会把它当作一个完整的词
+    return gram.encode("utf-8").hex()
+
+
+def _ngram_tokens(content: str) -> str:
+    grams = set()
+    for chunk in content.lower().split():
+        grams.update(chunk)
+        grams.update(chunk[i:i + 2] for i in range(len(chunk) - 1))
+    return " ".join(_gram_token(gram) for gram in grams)
+
+
+def update_message_fts(cache_dir) -> int:
+    """Index store rows added since the last update; returns how many were indexed."""
+    store_path = message_store_path(cache_dir)
+    if not store_path.exists():
+        return 0
+    close_pooled_connections()
+    conn = sqlite3.connect(store_path)
+    try:
+        conn.executescript(_SCHEMA)
+        row = conn.execute("SELECT last_message_id FROM fts_state WHERE id = 0").fetchone()
+        last_id = row[0] if row else 0
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+        if max_id <= last_id:
+            return 0
+        cursor = conn.execute(
+            f"INSERT INTO {FTS_TABLE}(rowid, content) "
+            "SELECT id, content FROM messages WHERE id > ? AND id <= ? AND content IS NOT NULL AND content != ''",
+            (last_id, max_id),
+        )
+        indexed = cursor.rowcount
+        rows = conn.execute(
+            "SELECT id, content FROM messages WHERE id > ? AND id <= ? AND content IS NOT NULL AND content != ''",
+            (last_id, max_id),
+        )
+        while True:
+            batch = list(islice(rows, MSG_BATCH_SIZE))
+            if not batch:
+                break
+            conn.executemany(
+                f"INSERT INTO {NGRAM_TABLE}(rowid, grams) VALUES (?, ?)",
+                [(message_id, _ngram_tokens(content)) for message_id, content in batch],
+            )
+        conn.execute("INSERT OR REPLACE INTO fts_state(id, last_message_id) VALUES (0, ?)", (max_id,))
+        conn.commit()
+        return indexed
+    finally:
+        conn.close()
+
+
+# filter_set 限定消息类型，contact 限定会话，start_time / end_time 限定时间范围
+# wxid 不在 Name2Id 中时返回表名中的 MD5；1~2 个字的查询按时间排序而不是按相关度
+def search_messages(
+    cache_dir,
+    query: str,
+    limit: int = 50,
+    filter_set=None,
+    contact: Optional[str] = None,
+    start_time: Optional[int] = None,
+    end_time: Optional[int] = None,
+) -> List[Tuple[str, Message]]:
+    """Messages containing ``query`` as (contact wxid, Message), best matches first."""
+    query = (query or "").strip()
+    store_path = message_store_path(cache_dir)
+    if not query or not store_path.exists():
+        return []
+    conditions, params = build_msg_filters(filter_set, start_time, end_time)
+    conditions = [f"m.{condition}" for condition in conditions]
+    if contact:
+        conditions.append("m.contact_md5 = ?")
+        params.append(str2md5(contact))
+    if len(query) >= MIN_FTS_QUERY_LEN:
+        # 整个查询作为一个短语匹配，双引号需转义
+        phrase = '"' + query.replace('"', '""') + '"'
+        sql = (
+            f"SELECT m.contact, m.sender, m.create_time, m.content FROM {FTS_TABLE} "
+            f"JOIN messages m ON m.id = {FTS_TABLE}.rowid WHERE {FTS_TABLE} MATCH ?"
+        )
+        params.insert(0, phrase)
+        order = f" ORDER BY {FTS_TABLE}.rank, m.create_time DESC"
+    elif not any(ch.isspace() for ch in query):
+        sql = (
+            f"SELECT m.contact, m.sender, m.create_time, m.content FROM {NGRAM_TABLE} "
+            f"JOIN messages m ON m.id = {NGRAM_TABLE}.rowid WHERE {NGRAM_TABLE} MATCH ?"
+        )
+        params.insert(0, _gram_token(query.lower()))
+        order = " ORDER BY m.create_time DESC"
+    else:
+        # 含空白的短查询无法使用索引，只能扫描，调用方应尽量限定好友或时间范围
+        sql = "SELECT m.contact, m.sender, m.create_time, m.content FROM messages m WHERE m.content LIKE ? ESCAPE '\\'"
+        escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        params.insert(0, f"%{escaped}%")
+        order = " ORDER BY m.create_time DESC"
+    if conditions:
+        sql += " AND " + " AND ".join(conditions)
+    sql += order + " LIMIT ?"
+    params.append(int(limit))
+
+    conn = acquire_db(store_path)
+    try:
+        rows = conn.execute(sql, tuple(params)).fetchall()
+    except DB_ERRORS as e:
+        print(f"[-] 聊天记录搜索失败: {e}")
+        return []
+    finally:
+        release_db(conn)
+    return [
+        (row["contact"], Message(create_time=row["create_time"], message_content=row["content"], sender_name=row["sender"]))
+        for row in rows
+    ]
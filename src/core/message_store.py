@@ -0,0 +1,213 @@
+"""Consolidated message store built from the decrypted message_N shards.
+
+All messages go into one indexed ``messages`` table in ``messages.sqlite``,
+content already decompressed, filled incrementally per (shard, table).
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import zstandard as zstd
+
+from core.db_connect import DB_ERRORS, acquire_db, close_pooled_connections, file_signature, release_db
+from core.get_chat_data import MSG_BATCH_SIZE, build_msg_filters, decode_contents
+from core.msg_table_index import build_msg_table_index, get_msg_table_index
+from core.name2id_cache import get_sender_names, resolve_sender
+from core.utils.message import Message
+from core.utils.str2md5 import str2md5
+
+STORE_NAME = "messages.sqlite"
+STORE_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages(
+    id INTEGER PRIMARY KEY,
+    contact_md5 TEXT NOT NULL,
+    contact TEXT NOT NULL,
+    sender TEXT,
+    local_type INTEGER,
+    create_time INTEGER,
+    content TEXT,
+    shard TEXT NOT NULL,
+    local_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_contact_time ON messages(contact_md5, create_time);
+CREATE INDEX IF NOT EXISTS idx_messages_type_time ON messages(local_type, create_time);
+CREATE TABLE IF NOT EXISTS sync_state(
+    shard TEXT NOT NULL,
+    table_md5 TEXT NOT NULL,
+    last_local_id INTEGER NOT NULL,
+    PRIMARY KEY(shard, table_md5)
+);
+CREATE TABLE IF NOT EXISTS shards(shard TEXT PRIMARY KEY, signature TEXT);
+"""
+
+
+def message_store_path(cache_dir) -> Path:
+    return Path(cache_dir) / STORE_NAME
+
+
+def _to_text(content) -> Optional[str]:
+    if isinstance(content, bytes):
+        return content.decode("utf-8", errors="ignore")
+    return content
+
+
+def _open_for_update(store_path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(store_path)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version not in (0, STORE_VERSION):
+        # 格式升级后旧数据全部作废，重新导入
+        conn.close()
+        store_path.unlink()
+        conn = sqlite3.connect(store_path)
+    conn.executescript(_SCHEMA)
+    conn.execute(f"PRAGMA user_version={STORE_VERSION}")
+    return conn
+
+
+def _copy_table(store, db_path, shard: str, md5_val: str, contact: str, hex_key, sender_names, dctx) -> int:
+    last_local_id = store.execute(
+        "SELECT last_local_id FROM sync_state WHERE shard = ? AND table_md5 = ?", (shard, md5_val)
+    ).fetchone()
+    last_local_id = last_local_id[0] if last_local_id else 0
+    conn = acquire_db(db_path, hex_key)
+    cursor = conn.cursor()
+    copied = 0
+    try:
+        cursor.execute(
+            "SELECT local_id, local_type, real_sender_id, create_time, message_content "
+            f"FROM Msg_{md5_val} WHERE local_id > ? ORDER BY local_id",
+            (last_local_id,),
+        )
+        while True:
+            rows = list(islice(cursor, MSG_BATCH_SIZE))
+            if not rows:
+                break
+            contents = decode_contents([row["message_content"] for row in rows], dctx)
+            store.executemany(
+                "INSERT INTO messages(contact_md5, contact, sender, local_type, create_time, content, shard, local_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        md5_val,
+                        contact,
+                        str(resolve_sender(sender_names, row["real_sender_id"])),
+                        row["local_type"],
+                        row["create_time"],
+                        _to_text(content),
+                        shard,
+                        row["local_id"],
+                    )
+                    for row, content in zip(rows, contents)
+                ],
+            )
+            last_local_id = rows[-1]["local_id"]
+            copied += len(rows)
+    finally:
+        cursor.close()
+        release_db(conn)
+    store.execute(
+        "INSERT OR REPLACE INTO sync_state(shard, table_md5, last_local_id) VALUES (?, ?, ?)",
+        (shard, md5_val, last_local_id),
+    )
+    return copied
+
+
+def update_message_store(cache_dir, db_paths: Iterable, hex_key: Optional[str] = None) -> int:
+    """Copy messages newer than each table's watermark into the store; returns rows added."""
+    db_paths = [str(p) for p in db_paths]
+    build_msg_table_index(cache_dir, db_paths, hex_key)
+    index = get_msg_table_index(cache_dir)
+    store_path = message_store_path(cache_dir)
+    # 池中对库文件的只读连接（immutable）在写入后会读到旧页，先全部关闭
+    close_pooled_connections()
+    store = _open_for_update(store_path)
+    dctx = zstd.ZstdDecompressor()
+    added = 0
+    try:
+        for db_path in db_paths:
+            shard = Path(db_path).name
+            signature = file_signature(db_path)
+            sender_names = get_sender_names(db_path, hex_key)
+            for md5_val in index.tables_in(db_path):
+                contact = index.wxid_for(md5_val) or md5_val
+                try:
+                    added += _copy_table(store, db_path, shard, md5_val, contact, hex_key, sender_names, dctx)
+                except DB_ERRORS as e:
+                    print(f"[-] 导入 {shard} 的 Msg_{md5_val} 失败: {e}")
+            store.execute(
+                "INSERT OR REPLACE INTO shards(shard, signature) VALUES (?, ?)",
+                (shard, json.dumps(signature)),
+            )
+            # 每个分库导入完成后提交一次，中断时已完成的分库不会重复导入
+            store.commit()
+    finally:
+        store.close()
+    return added
+
+
+def store_is_current(cache_dir, db_paths: Iterable) -> bool:
+    """True when the store exists and every shard is unchanged since it was imported."""
+    store_path = message_store_path(cache_dir)
+    if not store_path.exists():
+        return False
+    conn = acquire_db(store_path)
+    try:
+        # 旧格式的合并消息库要等下次导入时重建，在此之前不能使用
+        if conn.execute("PRAGMA user_version").fetchone()[0] != STORE_VERSION:
+            return False
+        recorded = {row["shard"]: row["signature"] for row in conn.execute("SELECT shard, signature FROM shards")}
+    except DB_ERRORS:
+        return False
+    finally:
+        release_db(conn)
+    return all(
+        recorded.get(Path(p).name) == json.dumps(file_signature(p)) for p in db_paths
+    )
+
+
+def iter_store_msgs(
+    cache_dir,
+    wxid: str,
+    filter_set=None,
+    limit: Optional[int] = None,
+    start_time: Optional[int] = None,
+    end_time: Optional[int] = None,
+) -> Iterator[Message]:
+    """Messages of one contact from the store, newest first; same filters as single_user_all_msg."""
+    conditions, params = build_msg_filters(filter_set, start_time, end_time)
+    # 按表名 MD5 查询：好友的 wxid 可能没有出现在 Name2Id 中
+    conditions.insert(0, "contact_md5 = ?")
+    params.insert(0, str2md5(wxid))
+    query = (
+        # 单个好友的查询总是走 (contact_md5, create_time) 索引，按时间倒序直接取前 limit 条
+        "SELECT sender, create_time, content FROM messages INDEXED BY idx_messages_contact_time WHERE "
+        + " AND ".join(conditions)
+        + " ORDER BY create_time DESC"
+    )
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(int(limit))
+    conn = acquire_db(message_store_path(cache_dir))
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, tuple(params))
+        while True:
+            rows = cursor.fetchmany(MSG_BATCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield Message(
+                    create_time=row["create_time"],
+                    message_content=row["content"],
+                    sender_name=row["sender"],
+                )
+    finally:
+        cursor.close()
+        release_db(conn)
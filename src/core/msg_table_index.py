@@ -0,0 +1,170 @@
+"""Persistent index of which message database holds each ``Msg_<md5>`` table.
+
+Table names are scanned once per database and saved in the cache directory;
+a database is rescanned only when its size or mtime changes.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from threading import Lock
+from typing import Iterable, List, Optional
+
+from core.db_connect import DB_ERRORS, acquire_db, file_signature, path_key, release_db
+from core.utils.str2md5 import str2md5
+
+INDEX_NAME = "msg_table_index.json"
+INDEX_VERSION = 1
+MSG_TABLE_PREFIX = "Msg_"
+# 消息分库的文件名（不含扩展名）；message_fts / message_resource 等不是消息分库
+MSG_DB_PATTERN = "message_[0-9]*"
+
+_indexes = {}
+_indexes_lock = Lock()
+
+
+def _scan_db(db_path, hex_key: Optional[str]) -> tuple:
+    """Return ([md5 of every Msg_ table], {md5: wxid}) for one database."""
+    conn = acquire_db(db_path, hex_key)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE ? ESCAPE '\\'",
+            (MSG_TABLE_PREFIX.replace("_", "\\_") + "%",),
+        )
+        tables = [row["name"][len(MSG_TABLE_PREFIX):] for row in cursor.fetchall()]
+        wxids = {}
+        try:
+            # Name2Id 记录了库内出现过的所有用户名，用来反查表名对应的 wxid
+            cursor.execute("SELECT user_name FROM Name2Id")
+            wanted = set(tables)
+            for row in cursor.fetchall():
+                user_name = row["user_name"]
+                if user_name:
+                    md5_val = str2md5(user_name)
+                    if md5_val in wanted:
+                        wxids[md5_val] = user_name
+        except DB_ERRORS:
+            pass
+        return tables, wxids
+    finally:
+        release_db(conn)
+
+
+def find_message_dbs(contact_db, hex_key: Optional[str] = None) -> List[Path]:
+    """Message shards next to ``contact_db``: decrypted copies or the encrypted db_storage layout."""
+    contact_db = Path(contact_db)
+    if hex_key:
+        # 加密原库位于 db_storage/contact/contact.db 与 db_storage/message/message_N.db
+        return sorted(contact_db.parent.parent.rglob(f"{MSG_DB_PATTERN}.db"))
+    return sorted(p for p in contact_db.parent.glob(f"{MSG_DB_PATTERN}.sqlite") if p.is_file())
+
+
+class MsgTableIndex:
+    """md5 / wxid -> databases holding ``Msg_<md5>``, persisted as JSON in ``index_dir``."""
+
+    def __init__(self, index_dir=None) -> None:
+        self._path = Path(index_dir) / INDEX_NAME if index_dir else None
+        self._lock = Lock()
+        # 规范化路径 -> {"sig": 文件签名, "tables": [md5, ...]}
+        self._dbs = {}
+        self._wxids = {}
+        self._tables = {}
+        self._load()
+
+    def _load(self) -> None:
+        if self._path is None or not self._path.exists():
+            return
+        try:
+            data = json.loads(self._path.read_text(encoding="utf-8"))
+        except Exception:
+            return
+        if data.get("version") != INDEX_VERSION:
+            return
+        self._dbs = data.get("dbs", {})
+        self._wxids = data.get("wxids", {})
+        self._rebuild_tables()
+
+    def _save(self) -> None:
+        if self._path is None:
+            return
+        data = {"version": INDEX_VERSION, "dbs": self._dbs, "wxids": self._wxids}
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, self._path)
+        except OSError as e:
+            print(f"[-] 保存消息表索引失败: {e}")
+
+    def _rebuild_tables(self) -> None:
+        tables = {}
+        for db_key, entry in self._dbs.items():
+            for md5_val in entry.get("tables", []):
+                tables.setdefault(md5_val, []).append(db_key)
+        self._tables = tables
+
+    def refresh(self, db_paths: Iterable, hex_key: Optional[str] = None) -> int:
+        """Rescan databases whose signature changed; returns how many were rescanned."""
+        with self._lock:
+            rescanned = 0
+            for db_path in db_paths:
+                db_key = path_key(db_path)
+                signature = file_signature(db_path)
+                signature = list(signature) if signature is not None else None
+                entry = self._dbs.get(db_key)
+                if signature is None:
+                    if entry is not None:
+                        del self._dbs[db_key]
+                        rescanned += 1
+                    continue
+                if entry is not None and entry.get("sig") == signature:
+                    continue
+                try:
+                    tables, wxids = _scan_db(db_path, hex_key)
+                except DB_ERRORS as e:
+                    print(f"[-] 扫描消息库 {db_path} 失败: {e}")
+                    self._dbs.pop(db_key, None)
+                    continue
+                self._dbs[db_key] = {"sig": signature, "tables": tables}
+                self._wxids.update(wxids)
+                rescanned += 1
+            if rescanned:
+                self._rebuild_tables()
+                self._save()
+            return rescanned
+
+    def locate(self, wxid: str, db_paths: Iterable, hex_key: Optional[str] = None) -> List[str]:
+        """Databases among ``db_paths`` (in that order) that hold the chat table of ``wxid``."""
+        db_paths = [str(p) for p in db_paths]
+        self.refresh(db_paths, hex_key)
+        with self._lock:
+            holders = set(self._tables.get(str2md5(wxid), ()))
+        return [p for p in db_paths if path_key(p) in holders]
+
+    def tables_in(self, db_path) -> List[str]:
+        """md5 of every ``Msg_`` table in ``db_path`` as of the last refresh."""
+        with self._lock:
+            return list(self._dbs.get(path_key(db_path), {}).get("tables", []))
+
+    def wxid_for(self, md5_val: str) -> Optional[str]:
+        """wxid whose table is ``Msg_<md5_val>``, if it appeared in a Name2Id table."""
+        with self._lock:
+            return self._wxids.get(md5_val)
+
+
+def get_msg_table_index(index_dir=None) -> MsgTableIndex:
+    """Shared index instance for ``index_dir`` (loaded from disk once per process)."""
+    key = path_key(index_dir) if index_dir else None
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = MsgTableIndex(index_dir)
+        return index
+
+
+def build_msg_table_index(index_dir, db_paths: Iterable, hex_key: Optional[str] = None) -> int:
+    """Bring the persisted index for ``db_paths`` up to date (e.g. right after decryption)."""
+    return get_msg_table_index(index_dir).refresh(db_paths, hex_key)
@@ -0,0 +1,44 @@
+"""Per-database cache of the Name2Id table (rowid -> username).
+
+Reloaded when the database file or its ``-wal`` changes.
+"""
+
+from __future__ import annotations
+
+from typing import List, Optional
+
+from core.db_connect import DB_ERRORS, SignatureCache, acquire_db, release_db
+
+# 每个数据库 rowid 下标的用户名列表
+_cache = SignatureCache()
+
+
+def _load_names(db_path, hex_key: Optional[str]) -> List[Optional[str]]:
+    conn = acquire_db(db_path, hex_key)
+    cursor = conn.cursor()
+    try:
+        # 显式查询 rowid，因为它默认不包含在 SELECT * 中
+        cursor.execute("SELECT rowid, user_name FROM Name2Id")
+        rows = [(row["rowid"], row["user_name"]) for row in cursor.fetchall()]
+    except DB_ERRORS as e:
+        print(f"[-] 读取 {db_path} 的 Name2Id 失败: {e}")
+        rows = []
+    finally:
+        cursor.close()
+        release_db(conn)
+    names = [None] * (max((rowid for rowid, _ in rows), default=-1) + 1)
+    for rowid, user_name in rows:
+        names[rowid] = user_name
+    return names
+
+
+def get_sender_names(db_path, hex_key: Optional[str] = None) -> List[Optional[str]]:
+    """rowid -> username list of the database's Name2Id table (None for unused rowids)."""
+    return _cache.get(db_path, lambda: _load_names(db_path, hex_key))
+
+
+def resolve_sender(names: List[Optional[str]], sender_id):
+    """Username for ``sender_id``; the id itself when it is not in Name2Id."""
+    if isinstance(sender_id, int) and 0 <= sender_id < len(names):
+        return names[sender_id] or sender_id
+    return sender_id
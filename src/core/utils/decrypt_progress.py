@@ -0,0 +1,66 @@
+import time
+
+from core.utils.wechat_constants import WeChatDecryptConstants
+
+
+class DecryptCancelled(Exception):
+    """解密被用户取消"""
+
+
+class DecryptProgress:
+    """统计解密进度：每个文件及总的字节数、页/秒吞吐量与预计剩余时间
+
+    callback 会收到 snapshot() 的结果，调用频率被限制在 min_interval 秒一次，
+    文件完成时总会触发一次
+    """
+
+    def __init__(self, file_sizes, callback=None, min_interval=0.2):
+        self.file_sizes = dict(file_sizes)
+        self.file_done = {name: 0 for name in self.file_sizes}
+        self.total_bytes = sum(self.file_sizes.values())
+        self.done_bytes = 0
+        self.files_done = 0
+        self.current_file = None
+        self.callback = callback
+        self.min_interval = min_interval
+        self.start_time = time.monotonic()
+        self._last_emit = 0.0
+
+    def advance(self, name, nbytes):
+        nbytes = min(nbytes, self.file_sizes.get(name, 0) - self.file_done.get(name, 0))
+        if nbytes > 0:
+            self.file_done[name] += nbytes
+            self.done_bytes += nbytes
+        self.current_file = name
+        self._emit()
+
+    def finish_file(self, name):
+        # 未变化而被跳过的页同样计入已完成
+        self.advance(name, self.file_sizes.get(name, 0))
+        self.files_done += 1
+        self._emit(force=True)
+
+    def snapshot(self):
+        elapsed = max(time.monotonic() - self.start_time, 1e-6)
+        bytes_per_sec = self.done_bytes / elapsed
+        remaining = self.total_bytes - self.done_bytes
+        return {
+            "file": self.current_file,
+            "file_done_bytes": self.file_done.get(self.current_file, 0),
+            "file_total_bytes": self.file_sizes.get(self.current_file, 0),
+            "done_bytes": self.done_bytes,
+            "total_bytes": self.total_bytes,
+            "files_done": self.files_done,
+            "files_total": len(self.file_sizes),
+            "pages_per_sec": bytes_per_sec / WeChatDecryptConstants().PAGE_SIZE,
+            "eta_seconds": remaining / bytes_per_sec if bytes_per_sec > 0 else None,
+        }
+
+    def _emit(self, force=False):
+        if self.callback is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_emit < self.min_interval:
+            return
+        self._last_emit = now
+        self.callback(self.snapshot())
@@ -0,0 +1,35 @@
+import hashlib
+import hmac
+import struct
+
+from Crypto.Cipher import AES
+
+from core.utils.wechat_constants import WeChatDecryptConstants
+
+_constants = WeChatDecryptConstants()
+
+
+def decrypt_page(enc_key, page, page_index):
+    """解密单个加密页，返回与原页等长的标准 SQLite 页 (page_index 从 0 开始)"""
+    page_size = _constants.PAGE_SIZE
+    salt_size = _constants.SALT_SIZE
+    data_end = page_size - _constants.RESERVE_SIZE
+    iv = bytes(page[data_end : data_end + _constants.IV_SIZE])
+    # 第一页前 16 字节是 Salt，不参与解密，对应位置写入标准头
+    offset = salt_size if page_index == 0 else 0
+    out = bytearray(page_size)
+    cipher = AES.new(enc_key, AES.MODE_CBC, iv)
+    cipher.decrypt(page[offset:data_end], output=memoryview(out)[offset:data_end])
+    if page_index == 0:
+        out[:salt_size] = _constants.SQLITE_FILE_HEADER
+    return out
+
+
+def verify_page_hmac(mac_key, page, page_index):
+    """校验加密页预留区中的 HMAC，HMAC 覆盖密文与 IV，末尾附加小端序页号 (从 1 开始)"""
+    page_size = _constants.PAGE_SIZE
+    offset = _constants.SALT_SIZE if page_index == 0 else 0
+    hmac_start = page_size - _constants.RESERVE_SIZE + _constants.IV_SIZE
+    mac = hmac.new(mac_key, page[offset:hmac_start], hashlib.sha512)
+    mac.update(struct.pack("<I", page_index + 1))
+    return hmac.compare_digest(mac.digest(), bytes(page[hmac_start : hmac_start + _constants.HMAC_SIZE]))
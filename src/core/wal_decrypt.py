@@ -0,0 +1,92 @@
+"""Apply the committed frames of an encrypted ``-wal`` file to the decrypted copy.
+
+Only frames of committed transactions with matching salts and a valid
+checksum are applied, as SQLite itself would read them.
+"""
+
+from __future__ import annotations
+
+import struct
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from core.utils.page_cipher import decrypt_page
+from core.utils.wechat_constants import WeChatDecryptConstants
+
+WAL_HEADER_SIZE = 32
+WAL_FRAME_HEADER_SIZE = 24
+WAL_MAGIC_LE = 0x377F0682
+WAL_MAGIC_BE = 0x377F0683
+
+
+def wal_path_for(db_path: Path) -> Path:
+    return Path(db_path).with_name(Path(db_path).name + "-wal")
+
+
+def _checksum(data: bytes, s1: int, s2: int, endian: str) -> Tuple[int, int]:
+    words = struct.unpack(f"{endian}{len(data) // 4}I", data)
+    for i in range(0, len(words), 2):
+        s1 = (s1 + words[i] + s2) & 0xFFFFFFFF
+        s2 = (s2 + words[i + 1] + s1) & 0xFFFFFFFF
+    return s1, s2
+
+
+# 页号从 0 开始，同一页以最后一个已提交的帧为准；WAL 为空、已重置或格式不符时返回 ({}, 0)
+def read_committed_frames(wal_path: Path) -> Tuple[Dict[int, int], int]:
+    """Scan a WAL file; returns ({page_index: frame_offset}, committed_page_count)."""
+    page_size = WeChatDecryptConstants().PAGE_SIZE
+    committed = {}
+    db_pages = 0
+    with open(wal_path, "rb") as f:
+        header = f.read(WAL_HEADER_SIZE)
+        if len(header) < WAL_HEADER_SIZE:
+            return committed, db_pages
+        magic, _, wal_page_size, _, salt1, salt2, ck1, ck2 = struct.unpack(">8I", header)
+        if magic not in (WAL_MAGIC_LE, WAL_MAGIC_BE) or wal_page_size != page_size:
+            return committed, db_pages
+        endian = ">" if magic == WAL_MAGIC_BE else "<"
+        s1, s2 = _checksum(header[:24], 0, 0, endian)
+        if (s1, s2) != (ck1, ck2):
+            return committed, db_pages
+
+        pending = {}
+        offset = WAL_HEADER_SIZE
+        while True:
+            frame = f.read(WAL_FRAME_HEADER_SIZE + page_size)
+            if len(frame) < WAL_FRAME_HEADER_SIZE + page_size:
+                break
+            pgno, commit_size, f_salt1, f_salt2, f_ck1, f_ck2 = struct.unpack(">6I", frame[:WAL_FRAME_HEADER_SIZE])
+            # Salt 不匹配说明是上一轮 WAL 的残留帧，之后的内容都无效
+            if (f_salt1, f_salt2) != (salt1, salt2) or pgno == 0:
+                break
+            s1, s2 = _checksum(frame[:8], s1, s2, endian)
+            s1, s2 = _checksum(frame[WAL_FRAME_HEADER_SIZE:], s1, s2, endian)
+            if (s1, s2) != (f_ck1, f_ck2):
+                break
+            pending[pgno - 1] = offset + WAL_FRAME_HEADER_SIZE
+            # commit_size 非 0 表示事务提交帧，之前的帧才真正生效
+            if commit_size:
+                committed.update(pending)
+                pending.clear()
+                db_pages = commit_size
+            offset += WAL_FRAME_HEADER_SIZE + page_size
+    committed = {index: pos for index, pos in committed.items() if index < db_pages}
+    return committed, db_pages
+
+
+# 返回 (写入的页号列表, 已提交的总页数)
+def apply_wal(wal_path: Path, output_path: Path, enc_key: bytes) -> Optional[Tuple[List[int], int]]:
+    """Decrypt committed WAL frames into ``output_path``; None when nothing was committed."""
+    page_size = WeChatDecryptConstants().PAGE_SIZE
+    frames, db_pages = read_committed_frames(wal_path)
+    if not db_pages:
+        return None
+    with open(wal_path, "rb") as f_wal, open(output_path, "r+b") as f_out:
+        # 提交时数据库的总页数决定解密结果的长度（可能增长或截断）
+        f_out.truncate(db_pages * page_size)
+        for index in sorted(frames):
+            f_wal.seek(frames[index])
+            page = f_wal.read(page_size)
+            f_out.seek(index * page_size)
+            f_out.write(decrypt_page(enc_key, page, index))
+    return sorted(frames), db_pages
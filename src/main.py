@@ -5,6 +5,7 @@ window. Backend wiring can be added later; for now we just render the shell
 window so the UI stack is verified.
 """
 
+import multiprocessing
 import sys
 
 from PyQt5.QtCore import Qt
@@ -34,4 +35,6 @@ def main() -> int:
 
 
 if __name__ == "__main__":
+	# 解密使用进程池，打包后的 exe 需要在子进程中跳过主窗口启动
+	multiprocessing.freeze_support()
 	sys.exit(main())
@@ -1,8 +1,10 @@
 """Decrypt page with a single action to trigger WeChat data decryption."""
 
+import threading
+
 from PyQt5.QtCore import QThread, QTimer, pyqtSignal
 from PyQt5.QtWidgets import QHBoxLayout, QLabel, QVBoxLayout, QWidget
-from qfluentwidgets import BodyLabel, PrimaryPushButton
+from qfluentwidgets import BodyLabel, PrimaryPushButton, ProgressBar, PushButton
 
 from core.direct_decrypt import decrypt_all_db
 from core.config_manager import app_config
@@ -42,9 +44,24 @@ class DecryptPage(QWidget):
         status_row.addWidget(self.fail_label)
         layout.addLayout(status_row)
 
+        self.progress_bar = ProgressBar(self)
+        self.progress_bar.setRange(0, 1000)
+        self.progress_bar.setVisible(False)
+        layout.addWidget(self.progress_bar)
+        self.progress_label = QLabel("", self)
+        self.progress_label.setVisible(False)
+        layout.addWidget(self.progress_label)
+
+        button_row = QHBoxLayout()
+        button_row.setSpacing(12)
         self.decrypt_btn = PrimaryPushButton("解密微信数据", self)
         self.decrypt_btn.clicked.connect(self._on_decrypt_clicked)
-        layout.addWidget(self.decrypt_btn)
+        self.cancel_btn = PushButton("取消", self)
+        self.cancel_btn.clicked.connect(self._on_cancel_clicked)
+        self.cancel_btn.setEnabled(False)
+        button_row.addWidget(self.decrypt_btn)
+        button_row.addWidget(self.cancel_btn)
+        layout.addLayout(button_row)
         layout.addStretch(1)
 
         self._anim_timer = QTimer(self)
@@ -56,24 +73,67 @@ class DecryptPage(QWidget):
         db_dir = cfg.get("weixin_file_path", "").strip()
         out_dir = cfg.get("cache_file_path", "").strip()
         hex_key = cfg.get("decryption_key", "").strip()
+        max_workers = cfg.get("decrypt_workers") or None
+        persist_keys = bool(cfg.get("persist_derived_keys", False))
+        build_store = bool(cfg.get("build_message_store", False))
+        build_search = bool(cfg.get("build_message_search", False))
+        build_stats = bool(cfg.get("build_contact_stats", False))
+        my_wxid = cfg.get("wx_id", "").strip() or None
+        # 未配置 decrypt_profile 时解密全部数据库；设为 "friends" 只解密好友页需要的 contact / message 库
+        selection = {
+            "profile": cfg.get("decrypt_profile") or None,
+            "include": cfg.get("decrypt_include") or None,
+            "exclude": cfg.get("decrypt_exclude") or None,
+            "priority": cfg.get("decrypt_priority") or None,
+        }
 
         if not (db_dir and out_dir and hex_key):
             self._set_status("配置缺失，请先在设置中填写路径与密钥。", success=False)
             return
 
         self._reset_status_running()
-        self._worker = _DecryptWorker(db_dir, out_dir, hex_key)
+        self._worker = _DecryptWorker(
+            db_dir, out_dir, hex_key, max_workers, persist_keys, selection, build_store, build_search, build_stats, my_wxid
+        )
         self._worker.result_ready.connect(self._on_decrypt_result)
+        self._worker.progress_changed.connect(self._on_progress)
         self._worker.start()
         self._anim_timer.start()
 
+    def _on_cancel_clicked(self) -> None:
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        self.cancel_btn.setEnabled(False)
+        self.status_label.setText("正在取消")
+
+    def _on_progress(self, info: dict) -> None:
+        total = info.get("total_bytes") or 0
+        done = info.get("done_bytes") or 0
+        self.progress_bar.setValue(int(done * 1000 / total) if total else 0)
+        text = (
+            f"{info.get('file') or ''}  {done / 1024 / 1024:.1f}/{total / 1024 / 1024:.1f} MB"
+            f"  文件 {info.get('files_done', 0)}/{info.get('files_total', 0)}"
+            f"  {info.get('pages_per_sec', 0):,.0f} 页/秒"
+        )
+        eta = info.get("eta_seconds")
+        if eta is not None:
+            text += f"  剩余约 {int(eta) // 60}:{int(eta) % 60:02d}"
+        self.progress_label.setText(text)
+
     def _on_decrypt_result(self, success: bool) -> None:
+        cancelled = self._worker is not None and self._worker.is_cancelled()
         self._anim_timer.stop()
         self.indicator.setVisible(False)
         self.decrypt_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
         self.check_label.setVisible(success)
-        self.fail_label.setVisible(not success)
-        self.status_label.setText("解密完成" if success else "解密失败")
+        self.fail_label.setVisible(not success and not cancelled)
+        if cancelled:
+            # 已完成的文件与页区间记录在清单中，再次解密时从中断处继续
+            self.status_label.setText("已取消，再次解密将从中断处继续")
+        else:
+            self.status_label.setText("解密完成" if success else "解密失败")
         self._worker = None
 
     def _tick_anim(self) -> None:
@@ -88,6 +148,11 @@ class DecryptPage(QWidget):
         self.fail_label.setVisible(False)
         self.indicator.setVisible(True)
         self.decrypt_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        self.progress_label.setText("")
+        self.progress_label.setVisible(True)
         self._dots_state = 0
         self.indicator.setText("...")
 
@@ -108,16 +173,57 @@ class DecryptPage(QWidget):
 
 class _DecryptWorker(QThread):
     result_ready = pyqtSignal(bool)
-
-    def __init__(self, db_dir: str, out_dir: str, hex_key: str) -> None:
+    # DecryptProgress.snapshot() 的字典，由工作线程发出，经排队连接在界面线程处理
+    progress_changed = pyqtSignal(dict)
+
+    def __init__(
+        self,
+        db_dir: str,
+        out_dir: str,
+        hex_key: str,
+        max_workers: int | None = None,
+        persist_keys: bool = False,
+        selection: dict | None = None,
+        build_store: bool = False,
+        build_search: bool = False,
+        build_stats: bool = False,
+        my_wxid: str | None = None,
+    ) -> None:
         super().__init__()
         self.db_dir = db_dir
         self.out_dir = out_dir
         self.hex_key = hex_key
+        self.max_workers = max_workers
+        self.persist_keys = persist_keys
+        self.selection = selection or {}
+        self.build_store = build_store
+        self.build_search = build_search
+        self.build_stats = build_stats
+        self.my_wxid = my_wxid
+        self._cancel_event = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancel_event.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
 
     def run(self) -> None:
         try:
-            result = decrypt_all_db(self.db_dir, self.out_dir, self.hex_key)
+            result = decrypt_all_db(
+                self.db_dir,
+                self.out_dir,
+                self.hex_key,
+                max_workers=self.max_workers,
+                persist_keys=self.persist_keys,
+                progress_callback=self.progress_changed.emit,
+                cancel_event=self._cancel_event,
+                build_message_store=self.build_store,
+                build_message_search=self.build_search,
+                build_contact_stats=self.build_stats,
+                my_wxid=self.my_wxid,
+                **self.selection,
+            )
             self.result_ready.emit(bool(result))
         except Exception as exc:
             print(f"解密异常: {exc}")
@@ -1,11 +1,15 @@
+import heapq
+import time
 import urllib.request
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
 from PyQt5.QtGui import QPixmap
 from PyQt5.QtWidgets import (
+	QCheckBox,
+	QComboBox,
 	QFrame,
 	QHBoxLayout,
 	QLabel,
@@ -17,13 +21,32 @@ from PyQt5.QtWidgets import (
 )
 from qfluentwidgets import BodyLabel
 
-from core.search_users import search_users
+from core.contact_index import ContactSearchSession
+from core.contact_stats import SECONDS_PER_DAY, YEAR_SECONDS, contact_ranks, contact_stats_path, rank_of
 from core.get_friend_info import single_user_info
 from core.get_chat_data import single_user_all_msg
+from core.contact_types import FRIEND, get_contact_type_index
+from core.message_store import iter_store_msgs, store_is_current
+from core.msg_table_index import MSG_DB_PATTERN, find_message_dbs
 from core.config_manager import app_config
 from core.call_llm import generate_greeting
+from core.encrypted_vfs import VFS_AVAILABLE
 from .friends_detailed import FriendsDetailView
 
+# 停止输入多久后开始搜索（毫秒）
+SEARCH_DEBOUNCE_MS = 200
+# 列表最多渲染的结果数，更多的结果需要继续输入关键词缩小范围
+MAX_RESULT_ITEMS = 200
+SEARCH_HINT = "输入关键词搜索好友（支持拼音与首字母）"
+# 结果排序方式：(显示文字, contact_stats 中的列)，None 为按匹配度
+SORT_OPTIONS = (
+	("按匹配度", None),
+	("按最近联系", "last_time"),
+	("按消息数", "message_count"),
+	("按近一年活跃天数", "active_days_last_year"),
+)
+NO_STATS_HINT = "尚无好友统计，请在配置中开启 build_contact_stats 并填写 wx_id 后重新解密"
+
 
 class FriendsPage(QWidget):
 	"""Two-pane friends page with a search bar on the left."""
@@ -34,6 +57,13 @@ class FriendsPage(QWidget):
 		self._avatar_cache: Dict[str, Optional[QPixmap]] = {}
 		self._selected_item: Optional[QFrame] = None
 		self._selected_user: Optional[Dict] = None
+		# wx_dir -> (所在目录的修改时间, 联系人库, 消息库列表)
+		self._encrypted_sources: Dict[str, Tuple[tuple, Optional[Path], List[Path]]] = {}
+		# 边输入边搜索：序号用于丢弃过期结果，会话用于在上一次结果中收窄
+		self._search_seq = 0
+		self._search_auto_select = False
+		self._search_workers: List["_SearchWorker"] = []
+		self._search_session = ContactSearchSession()
 		self._init_ui()
 
 	def _init_ui(self) -> None:
@@ -51,6 +81,25 @@ class FriendsPage(QWidget):
 		self.search_box.setPlaceholderText("搜索好友")
 		self.search_box.setClearButtonEnabled(True)
 		self.search_box.returnPressed.connect(self._on_search_submitted)
+		self.search_box.textChanged.connect(self._on_search_text_changed)
+
+		self._search_timer = QTimer(self)
+		self._search_timer.setSingleShot(True)
+		self._search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+		self._search_timer.timeout.connect(self._on_search_timeout)
+
+		# 按 contact_stats 的统计排序与筛选；未输入关键词时列出有聊天记录的好友
+		self.sort_box = QComboBox(self.left_panel)
+		for text, column in SORT_OPTIONS:
+			self.sort_box.addItem(text, column)
+		self.sort_box.currentIndexChanged.connect(self._on_sort_changed)
+		self.recent_only_box = QCheckBox("近一年联系过", self.left_panel)
+		self.recent_only_box.toggled.connect(self._on_sort_changed)
+		sort_row = QHBoxLayout()
+		sort_row.setContentsMargins(0, 0, 0, 0)
+		sort_row.setSpacing(8)
+		sort_row.addWidget(self.sort_box, 1)
+		sort_row.addWidget(self.recent_only_box)
 
 		self.results_area = QScrollArea(self.left_panel)
 		self.results_area.setWidgetResizable(True)
@@ -63,6 +112,7 @@ class FriendsPage(QWidget):
 		self.results_area.setWidget(self.results_container)
 
 		left_layout.addWidget(self.search_box)
+		left_layout.addLayout(sort_row)
 		left_layout.addWidget(self.results_area, 1)
 
 		self.right_panel = QWidget(self)
@@ -86,20 +136,37 @@ class FriendsPage(QWidget):
 		root_layout.addWidget(self.left_panel)
 		root_layout.addWidget(self.right_panel, 1)
 
-		self._show_status_message("输入关键词后按回车搜索好友")
+		self._show_status_message(SEARCH_HINT)
+
+	def _on_search_text_changed(self, _text: str) -> None:
+		# 每次按键都重新计时，停止输入后才真正搜索
+		self._search_timer.start()
+
+	def _on_search_timeout(self) -> None:
+		self._do_search(self.search_box.text().strip(), auto_select=False)
+
+	def _on_sort_changed(self, *_args) -> None:
+		self._search_timer.stop()
+		self._do_search(self.search_box.text().strip(), auto_select=False)
 
 	def _on_search_submitted(self) -> None:
+		self._search_timer.stop()
 		query = self.search_box.text().strip()
 		self._do_search(query)
 
-	def _do_search(self, query: str) -> None:
-		if not query:
+	def _do_search(self, query: str, auto_select: bool = True) -> None:
+		# 新的查询开始后，之前未完成的查询全部作废
+		self._search_seq += 1
+		self._cancel_search_workers()
+		order_by = self.sort_box.currentData()
+		recent_only = self.recent_only_box.isChecked()
+		if not query and not order_by and not recent_only:
 			self._clear_results()
-			self._show_status_message("输入关键词后按回车搜索好友")
+			self._show_status_message(SEARCH_HINT)
 			self._hide_blessing_text()
 			return
 
-		db_path = self._resolve_db_path()
+		db_path, message_dbs, hex_key = self._resolve_sources()
 		self._db_path = db_path
 		if not db_path or not db_path.exists():
 			self._clear_results()
@@ -107,24 +174,67 @@ class FriendsPage(QWidget):
 			self._hide_blessing_text()
 			return
 
-		results = search_users(str(db_path), query) or []
+		# 统计由解密流程写在缓存目录中，与联系人库的副本放在一起
+		stats_dir = self._resolve_db_path()
+		stats_dir = stats_dir.parent if stats_dir else None
+		if not query and (stats_dir is None or not contact_stats_path(stats_dir).exists()):
+			self._clear_results()
+			self._show_status_message(NO_STATS_HINT)
+			self._hide_blessing_text()
+			return
+
+		self._search_auto_select = auto_select
+		worker = _SearchWorker(
+			self._search_seq,
+			self._search_session,
+			str(db_path),
+			[str(p) for p in message_dbs],
+			query,
+			hex_key,
+			str(stats_dir) if stats_dir else None,
+			order_by,
+			recent_only,
+		)
+		worker.result_ready.connect(self._on_search_result)
+		worker.finished.connect(lambda w=worker: self._on_search_worker_finished(w))
+		self._search_workers.append(worker)
+		worker.start()
+
+	def _cancel_search_workers(self) -> None:
+		for worker in self._search_workers:
+			worker.cancel()
+
+	def _on_search_worker_finished(self, worker: "_SearchWorker") -> None:
+		if worker in self._search_workers:
+			self._search_workers.remove(worker)
+		worker.deleteLater()
+
+	def _on_search_result(self, seq: int, results) -> None:
+		if seq != self._search_seq:
+			# 期间已有更新的查询，丢弃过期结果
+			return
 		if not results:
 			self._clear_results()
 			self._show_status_message("没有匹配的好友")
 			self._hide_blessing_text()
 			return
 
-		self._render_results(results)
+		self._render_results(results, auto_select=self._search_auto_select)
 
-	def _render_results(self, users: List[Dict]) -> None:
+	def _render_results(self, users: List[Dict], auto_select: bool = True) -> None:
 		self._clear_results()
 		items: List[QFrame] = []
-		for user in users:
+		for user in users[:MAX_RESULT_ITEMS]:
 			item = self._build_user_item(user)
 			items.append(item)
 			self.results_layout.insertWidget(self.results_layout.count() - 1, item)
-		# auto-select first result
-		if users and items:
+		if len(users) > MAX_RESULT_ITEMS:
+			label = BodyLabel(f"结果超过 {MAX_RESULT_ITEMS} 个，仅显示前 {MAX_RESULT_ITEMS} 个，请输入更多关键词", self.results_container)
+			label.setWordWrap(True)
+			label.setStyleSheet("color: #666;")
+			self.results_layout.insertWidget(self.results_layout.count() - 1, label)
+		# auto-select first result (only when the search was submitted with Enter)
+		if auto_select and users and items:
 			self._handle_user_clicked(None, users[0], items[0])
 
 	def _build_user_item(self, user: Dict) -> QFrame:
@@ -144,7 +254,8 @@ class FriendsPage(QWidget):
 		avatar_label.setStyleSheet(
 			"border-radius: 20px; background-color: #f0f0f0; font-weight: 600;"
 		)
-		pixmap = self._extract_avatar(user)
+		# 列表项不在界面线程上下载网络头像，只使用本地或已缓存的头像
+		pixmap = self._extract_avatar(user, allow_download=False)
 		if pixmap:
 			avatar_label.setPixmap(
 				pixmap.scaled(40, 40, Qt.KeepAspectRatio, Qt.SmoothTransformation)
@@ -212,43 +323,43 @@ class FriendsPage(QWidget):
 
 		self._set_blessing_text("正在生成祝福，请稍候…")
 
-		import time
 		# start_time = time.time()
 		config = self._load_config()
-		cache_dir = (config.get("cache_file_path") or "").strip()
-		if not cache_dir:
+		contact_db, message_dbs, hex_key = self._resolve_sources()
+		if contact_db is None:
 			print("[生成祝福] cache_file_path 未配置。")
 			self._set_blessing_text("缺少缓存路径配置，无法生成祝福。")
 			return
-		base = Path(cache_dir)
-		contact_db = base / "contact.sqlite"
 		if not contact_db.exists():
 			print(f"[生成祝福] 未找到联系人库: {contact_db}")
 			self._set_blessing_text("未找到联系人库，无法生成祝福。")
 			return
 
-		message_dbs = sorted(p for p in base.glob("message_*.sqlite") if p.is_file())
 		if not message_dbs:
 			print("[生成祝福] 未找到任何 message_*.sqlite 日志库。")
 			self._set_blessing_text("未找到聊天记录数据库，无法生成祝福。")
 			return
 		# initialize_time = time.time()
 		try:
-			user_info = single_user_info(str(contact_db), wxid)
+			user_info = single_user_info(str(contact_db), wxid, hex_key)
 		except Exception as exc:
 			print(f"[生成祝福] 读取用户信息失败: {exc}")
 			user_info = None
 		# user_info_time = time.time()
 		try:
-			chat_info = single_user_all_msg([str(p) for p in message_dbs], wxid, {1})
+			# 直接读取加密库时，消息表位置索引保存在缓存目录中
+			cache_dir = (config.get("cache_file_path") or "").strip()
+			index_dir = cache_dir if hex_key and cache_dir and Path(cache_dir).expanduser().is_dir() else None
+			# 只读取最近的100条文字消息来生成祝福；合并消息库与解密分库一致时直接查询它
+			if not hex_key and store_is_current(contact_db.parent, message_dbs):
+				chat_info = list(iter_store_msgs(contact_db.parent, wxid, {1}, limit=100))
+			else:
+				chat_info = single_user_all_msg([str(p) for p in message_dbs], wxid, {1}, hex_key, index_dir, limit=100)
 		except Exception as exc:
 			print(f"[生成祝福] 读取聊天记录失败: {exc}")
 			chat_info = []
 		#chat_info_time = time.time()
 		
-  		# 只使用最近的100条消息来生成祝福
-		if len(chat_info) > 100:
-			chat_info = chat_info[:100]
 
 		chat_history_info = ""
 		cfg = app_config.reload()
@@ -327,11 +438,11 @@ class FriendsPage(QWidget):
 	def _initials(name: str) -> str:
 		return name[:1].upper() if name else "?"
 
-	def _extract_avatar(self, user: Dict) -> Optional[QPixmap]:
+	def _extract_avatar(self, user: Dict, allow_download: bool = True) -> Optional[QPixmap]:
 		# Prefer explicit small head URL/path field
 		preferred = user.get("small_head_url") or user.get("small_head_img_url")
 		if preferred:
-			pix = self._load_pixmap(preferred)
+			pix = self._load_pixmap(preferred, allow_download)
 			if pix:
 				return pix
 
@@ -349,12 +460,12 @@ class FriendsPage(QWidget):
 		]
 		for key in candidates:
 			val = user.get(key)
-			pix = self._load_pixmap(val)
+			pix = self._load_pixmap(val, allow_download)
 			if pix:
 				return pix
 		return None
 
-	def _load_pixmap(self, source) -> Optional[QPixmap]:
+	def _load_pixmap(self, source, allow_download: bool = True) -> Optional[QPixmap]:
 		if not source:
 			return None
 		if isinstance(source, (bytes, bytearray)):
@@ -366,6 +477,8 @@ class FriendsPage(QWidget):
 			if source.startswith("http://") or source.startswith("https://"):
 				if source in self._avatar_cache:
 					return self._avatar_cache[source]
+				if not allow_download:
+					return None
 				try:
 					with urllib.request.urlopen(source, timeout=5) as resp:
 						data = resp.read()
@@ -394,6 +507,127 @@ class FriendsPage(QWidget):
 			return path / "contact.sqlite"
 		return path
 
+	def _resolve_sources(self) -> Tuple[Optional[Path], List[Path], Optional[str]]:
+		"""Return (contact db, message dbs, hex key or None) for the data layer.
+
+		With ``query_encrypted_db`` enabled (and apsw installed) the original
+		encrypted databases are read directly; otherwise the decrypted copies
+		in the cache directory are used.
+		"""
+		config = self._load_config()
+		wx_dir = (config.get("weixin_file_path") or "").strip()
+		hex_key = (config.get("decryption_key") or "").strip()
+		if config.get("query_encrypted_db") and VFS_AVAILABLE and wx_dir and hex_key:
+			cached = self._encrypted_sources.get(wx_dir)
+			# 新增的分库（如 message_3.db）会改变所在目录的修改时间，此时重新扫描；上次没找到时也重新扫描
+			if cached is None or not cached[1] or not cached[2] or cached[0] != self._dirs_mtime(cached[1], cached[2]):
+				base = Path(wx_dir).expanduser()
+				contact_db = next(base.rglob("contact.db"), None)
+				message_dbs = sorted(base.rglob(f"{MSG_DB_PATTERN}.db"))
+				cached = (self._dirs_mtime(contact_db, message_dbs), contact_db, message_dbs)
+				self._encrypted_sources[wx_dir] = cached
+			_, contact_db, message_dbs = cached
+			return contact_db, message_dbs, hex_key
+
+		contact_db = self._resolve_db_path()
+		if contact_db is None:
+			return None, [], None
+		# 只取 message_N 分库，与合并消息库、好友分类使用同一规则
+		message_dbs = find_message_dbs(contact_db)
+		return contact_db, message_dbs, None
+
+	@staticmethod
+	def _dirs_mtime(contact_db: Optional[Path], message_dbs: List[Path]) -> tuple:
+		dirs = sorted({p.parent for p in message_dbs} | ({contact_db.parent} if contact_db else set()))
+		mtimes = []
+		for directory in dirs:
+			try:
+				mtimes.append(directory.stat().st_mtime_ns)
+			except OSError:
+				mtimes.append(None)
+		return tuple(mtimes)
+
 	def _load_config(self) -> Dict:
 		# Reload to keep in sync with updates from settings page
 		return app_config.reload()
+
+
+class _SearchWorker(QThread):
+	"""Runs one contact search off the GUI thread; results of cancelled searches are never emitted."""
+
+	result_ready = pyqtSignal(int, object)
+
+	def __init__(
+		self,
+		seq: int,
+		session: ContactSearchSession,
+		db_path: str,
+		message_dbs: List[str],
+		query: str,
+		hex_key: Optional[str],
+		stats_dir: Optional[str] = None,
+		order_by: Optional[str] = None,
+		recent_only: bool = False,
+	) -> None:
+		super().__init__()
+		self.seq = seq
+		self.session = session
+		self.db_path = db_path
+		self.message_dbs = message_dbs
+		self.query = query
+		self.hex_key = hex_key
+		self.stats_dir = stats_dir
+		self.order_by = order_by
+		self.recent_only = recent_only
+		self._cancelled = False
+
+	def cancel(self) -> None:
+		self._cancelled = True
+
+	def run(self) -> None:
+		if self._cancelled:
+			return
+		try:
+			# 只在好友中搜索，群聊、公众号与只在群里出现过的陌生人不列出（分类见 core/contact_types.py）
+			# 首次搜索或联系人库变化后需要加载索引，其余情况直接命中缓存；并发的搜索共用同一次加载
+			types = get_contact_type_index(self.db_path, self.message_dbs, self.hex_key)
+			if self._cancelled:
+				return
+			index = types.search_index(FRIEND)
+			if self._cancelled:
+				return
+			if self.stats_dir and (self.order_by or self.recent_only or not self.query):
+				results = self._apply_stats(index)
+			else:
+				# 多取一个用来判断结果是否超出显示上限，短查询无需扫描全部联系人
+				results = self.session.search(index, self.query, limit=MAX_RESULT_ITEMS + 1)
+		except Exception as exc:
+			print(f"搜索好友失败: {exc}")
+			results = []
+		if not self._cancelled:
+			self.result_ready.emit(self.seq, results)
+
+	def _apply_stats(self, index) -> List:
+		since = None
+		if self.recent_only:
+			# 按天取整，同一天内的搜索共用缓存的排序结果
+			since = (int(time.time()) // SECONDS_PER_DAY) * SECONDS_PER_DAY - YEAR_SECONDS
+		# 排序与筛选由 SQL 完成，这里只查每个联系人的名次；统计文件不变时名次表直接命中缓存
+		ranks = contact_ranks(self.stats_dir, self.order_by or "last_time", since)
+		if not ranks and not self.query:
+			return []
+		# 未输入关键词时从全部好友中挑选有聊天记录的
+		matched = self.session.search(index, self.query) if self.query else index.records()
+		ranked = []
+		unranked = []
+		for position, user in enumerate(matched):
+			rank = rank_of(ranks, user.username or "")
+			if rank is not None:
+				# 按匹配度排序时以匹配顺序为名次，只用统计做筛选
+				ranked.append((rank if self.order_by else position, user))
+			elif self.query and not self.recent_only:
+				unranked.append(user)
+		# 只取出要显示的前若干名，多取一个用来判断是否超出显示上限
+		top = heapq.nsmallest(MAX_RESULT_ITEMS + 1, ranked, key=lambda item: item[0])
+		# 有关键词时没有聊天记录的匹配项排在最后
+		return [user for _, user in top] + unranked[:MAX_RESULT_ITEMS + 1 - len(top)]
@@ -17,6 +17,7 @@ from PyQt5.QtWidgets import (
 from qfluentwidgets import BodyLabel, LineEdit, PrimaryPushButton, PushButton
 from core.get_key import get_key
 from core.config_manager import app_config
+from core.direct_decrypt import find_probe_db, verify_key
 
 
 class SettingsPage(QWidget):
@@ -49,10 +50,16 @@ class SettingsPage(QWidget):
         key_btn_row = QHBoxLayout()
         key_btn_row.setAlignment(Qt.AlignHCenter)
         self.auto_key_btn = PushButton("自动捕获密钥", self)
+        self.check_key_btn = PushButton("验证密钥", self)
         self.save_key_btn = PrimaryPushButton("保存密钥", self)
         key_btn_row.addWidget(self.auto_key_btn)
+        key_btn_row.addWidget(self.check_key_btn)
         key_btn_row.addWidget(self.save_key_btn)
         layout.addLayout(key_btn_row)
+        self.key_status_label = QLabel("", self)
+        self.key_status_label.setAlignment(Qt.AlignHCenter)
+        layout.addWidget(self.key_status_label)
+        self._key_check_worker = None
 
         self.model_name_input = self._add_field(layout, "模型名称", "例如：GLM-5、gemini-3-flash-preview、qwen3.5-397b-a17b")
         self.model_api_input = self._add_field(layout, "模型 API Key", "用于生成祝福的 API Key")
@@ -71,6 +78,7 @@ class SettingsPage(QWidget):
         # auto_path_btn is exposed for later wiring to search logic
         # self.auto_path_btn.clicked.connect(self._auto_generate_paths)
         self.auto_key_btn.clicked.connect(self._show_key_capture_hint)
+        self.check_key_btn.clicked.connect(self._check_key)
         self.save_key_btn.clicked.connect(self._save_key)
         self.save_model_btn.clicked.connect(self._save_model_settings)
     
@@ -122,6 +130,31 @@ class SettingsPage(QWidget):
         else:
             print("密钥已保存到 config.json")
 
+    # check_key_btn
+    # 用微信数据目录中最小数据库的第一页 HMAC 校验密钥
+    def _check_key(self) -> None:
+        key_value = self.key_input.text().strip()
+        wx_path = self._normalize_path_input(self.ori_path_input.text()) or app_config.get("weixin_file_path", "")
+        if not key_value or not wx_path:
+            self._set_key_status("请先填写微信数据路径与密钥", success=False)
+            return
+        self.check_key_btn.setEnabled(False)
+        self._set_key_status("正在验证密钥…", success=None)
+        self._key_check_worker = _KeyCheckWorker(wx_path, key_value)
+        self._key_check_worker.result_ready.connect(self._on_key_checked)
+        self._key_check_worker.start()
+
+    def _on_key_checked(self, success: bool, message: str) -> None:
+        self.check_key_btn.setEnabled(True)
+        self._set_key_status(message, success=success)
+        self._key_check_worker = None
+
+    def _set_key_status(self, text: str, success: bool | None) -> None:
+        color = {True: "green", False: "red"}.get(success, "#666")
+        prefix = {True: "✔ ", False: "✖ "}.get(success, "")
+        self.key_status_label.setStyleSheet(f"color: {color};")
+        self.key_status_label.setText(prefix + text)
+
     def _save_model_settings(self) -> None:
         model_name = self.model_name_input.text().strip()
         model_api = self.model_api_input.text().strip()
@@ -291,3 +324,26 @@ class _KeyWorker(QThread):
     def run(self) -> None:
         result = get_key()
         self.result_ready.emit(result)
+
+
+class _KeyCheckWorker(QThread):
+    result_ready = pyqtSignal(bool, str)
+
+    def __init__(self, db_dir: str, hex_key: str) -> None:
+        super().__init__()
+        self.db_dir = db_dir
+        self.hex_key = hex_key
+
+    def run(self) -> None:
+        try:
+            probe_db = find_probe_db(self.db_dir)
+            if probe_db is None:
+                self.result_ready.emit(False, "微信数据路径下未找到数据库文件")
+                return
+            if verify_key(probe_db, self.hex_key):
+                self.result_ready.emit(True, "密钥有效")
+            else:
+                self.result_ready.emit(False, "密钥无效")
+        except Exception as exc:
+            print(f"验证密钥异常: {exc}")
+            self.result_ready.emit(False, "验证密钥失败")
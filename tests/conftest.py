@@ -0,0 +1,35 @@
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from helpers import KEY, build_wechat_dir  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def wechat(tmp_path_factory):
+    """(encrypted WeChat folder, {relative path: plaintext}) shared by the session; do not modify."""
+    return build_wechat_dir(tmp_path_factory.mktemp("wechat"))
+
+
+@pytest.fixture(scope="session")
+def decrypted_dir(wechat, tmp_path_factory):
+    """Decrypted copy of the session WeChat folder, with the message store and search index."""
+    from core.direct_decrypt import decrypt_all_db
+
+    out_dir = tmp_path_factory.mktemp("decrypted")
+    assert decrypt_all_db(wechat[0], out_dir, KEY, max_workers=1, build_message_store=True,
+                          build_message_search=True)
+    return out_dir
+
+
+@pytest.fixture
+def wechat_copy(wechat, tmp_path):
+    """Private copy of the encrypted folder for tests that change the source files."""
+    target = tmp_path / "wx"
+    shutil.copytree(wechat[0], target)
+    return target
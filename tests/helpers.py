@@ -0,0 +1,179 @@
+"""Synthetic WeChat data for the tests: SQLCipher 4 style encrypted databases.
+
+Plaintext databases are written with 80 reserved bytes per page (IV + HMAC),
+like WeChat's, then encrypted page by page with the same scheme the
+decryptor expects.
+"""
+
+import ctypes
+import hashlib
+import hmac
+import os
+import struct
+from pathlib import Path
+
+import pytest
+import zstandard
+from Crypto.Cipher import AES
+
+apsw = pytest.importorskip("apsw")
+
+KEY = "ab" * 32
+WRONG_KEY = "cd" * 32
+PAGE_SIZE = 4096
+RESERVE_SIZE = 80
+ME = "wxid_me"
+
+# username -> (local_type, remark, nick_name, verify_flag)
+CONTACTS = {
+    "wxid_f0": (1, "张三", "zhang", 0),
+    "wxid_f1": (1, "李四", "lisi", 0),
+    "wxid_f2": (1, "", "王五", 0),
+    "wxid_f3": (1, "同事老赵", "zhao", 0),
+    "wxid_silent": (1, "没聊过", "", 0),
+    "wxid_stranger": (3, "", "群里的路人", 0),
+    "gh_news": (1, "", "新闻公众号", 8),
+    "123@chatroom": (2, "", "家庭群", 0),
+}
+# 每个分库中的消息：wxid -> [(create_time, sender, text, compressed)]
+MESSAGES = {
+    0: {
+        "wxid_f0": [(1700000000, ME, "新年快乐", False), (1700000100, "wxid_f0", "宝宝睡了", True)],
+        "wxid_f1": [(1700000200, "wxid_f1", "找工作好难", False)],
+        "123@chatroom": [(1700000300, "wxid_f2", "群里说话", False)],
+    },
+    1: {
+        "wxid_f0": [(1710000000, "wxid_f0", "hello world", False), (1710000100, ME, "今天吃什么", False)],
+        "wxid_f2": [(1710000200, ME, "在吗", False), (1710000300, ME, "加油", True)],
+    },
+}
+
+
+def derive_keys(hex_key, salt):
+    enc_key = hashlib.pbkdf2_hmac("sha512", bytes.fromhex(hex_key), salt, 256000, 32)
+    mac_key = hashlib.pbkdf2_hmac("sha512", enc_key, bytes(b ^ 0x3A for b in salt), 2, 32)
+    return enc_key, mac_key
+
+
+def encrypt_page(plain, page_no, keys, salt):
+    enc_key, mac_key = keys
+    offset = 16 if page_no == 1 else 0
+    iv = os.urandom(16)
+    body = AES.new(enc_key, AES.MODE_CBC, iv).encrypt(plain[offset:PAGE_SIZE - RESERVE_SIZE])
+    body = (salt if page_no == 1 else b"") + body + iv
+    mac = hmac.new(mac_key, body[offset:] + struct.pack("<I", page_no), hashlib.sha512).digest()
+    return body + mac
+
+
+def encrypt_db(plain, hex_key=KEY, salt=None, keys=None):
+    salt = salt or os.urandom(16)
+    keys = keys or derive_keys(hex_key, salt)
+    pages = [
+        encrypt_page(plain[i:i + PAGE_SIZE], i // PAGE_SIZE + 1, keys, salt)
+        for i in range(0, len(plain), PAGE_SIZE)
+    ]
+    return b"".join(pages), salt, keys
+
+
+def _wal_checksum(data, s1, s2):
+    words = struct.unpack(f"<{len(data) // 4}I", data)
+    for i in range(0, len(words), 2):
+        s1 = (s1 + words[i] + s2) & 0xFFFFFFFF
+        s2 = (s2 + words[i + 1] + s1) & 0xFFFFFFFF
+    return s1, s2
+
+
+def make_wal(frames, keys, salt, wal_salt=(1, 2)):
+    """WAL bytes for ``frames``: [(page_no, plain_page, commit_size)], commit_size 0 = not a commit."""
+    header = struct.pack(">6I", 0x377F0682, 3007000, PAGE_SIZE, 0, *wal_salt)
+    s1, s2 = _wal_checksum(header, 0, 0)
+    out = bytearray(header + struct.pack(">2I", s1, s2))
+    for page_no, plain, commit in frames:
+        data = encrypt_page(plain, page_no, keys, salt)
+        frame_header = struct.pack(">4I", page_no, commit, *wal_salt)
+        s1, s2 = _wal_checksum(frame_header[:8], s1, s2)
+        s1, s2 = _wal_checksum(data, s1, s2)
+        out += frame_header + struct.pack(">2I", s1, s2) + data
+    return bytes(out)
+
+
+def _new_plain_db(path):
+    conn = apsw.Connection(str(path))
+    conn.execute(f"PRAGMA page_size={PAGE_SIZE}")
+    # 与微信一致，每页保留 80 字节给 IV 与 HMAC
+    reserve = ctypes.c_int(RESERVE_SIZE)
+    conn.file_control("main", apsw.SQLITE_FCNTL_RESERVE_BYTES, ctypes.addressof(reserve))
+    return conn
+
+
+def md5(text):
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def _build_contact_db(path):
+    conn = _new_plain_db(path)
+    conn.execute(
+        "CREATE TABLE contact(id INTEGER PRIMARY KEY, username TEXT, local_type INTEGER, alias TEXT, "
+        "remark TEXT, nick_name TEXT, description TEXT, small_head_url TEXT, big_head_url TEXT, "
+        "verify_flag INTEGER, extra_buffer BLOB)"
+    )
+    for username, (local_type, remark, nick_name, verify_flag) in CONTACTS.items():
+        conn.execute(
+            "INSERT INTO contact(username, local_type, remark, nick_name, description, verify_flag, extra_buffer) "
+            "VALUES (?, ?, ?, ?, '', ?, ?)",
+            (username, local_type, remark, nick_name, verify_flag, b"extra-" + username.encode()),
+        )
+    conn.close()
+
+
+def _build_message_db(path, shard):
+    cctx = zstandard.ZstdCompressor()
+    conn = _new_plain_db(path)
+    conn.execute("CREATE TABLE Name2Id(user_name TEXT PRIMARY KEY, is_session INTEGER)")
+    for username in [ME] + list(CONTACTS):
+        conn.execute("INSERT INTO Name2Id(user_name, is_session) VALUES (?, 1)", (username,))
+    ids = {row[0]: row[1] for row in conn.execute("SELECT user_name, rowid FROM Name2Id")}
+    for wxid, messages in MESSAGES[shard].items():
+        table = f"Msg_{md5(wxid)}"
+        conn.execute(
+            f"CREATE TABLE {table}(local_id INTEGER PRIMARY KEY AUTOINCREMENT, server_id INTEGER, "
+            "local_type INTEGER, sort_seq INTEGER, real_sender_id INTEGER, create_time INTEGER, "
+            "status INTEGER, message_content TEXT, compress_content BLOB)"
+        )
+        for i, (create_time, sender, text, compressed) in enumerate(messages):
+            content = cctx.compress(text.encode("utf-8")) if compressed else text
+            conn.execute(
+                f"INSERT INTO {table}(server_id, local_type, sort_seq, real_sender_id, create_time, status, "
+                "message_content) VALUES (?, 1, ?, ?, ?, 0, ?)",
+                (i, create_time * 1000, ids[sender], create_time, content),
+            )
+    conn.close()
+
+
+def build_wechat_dir(root):
+    """Encrypted ``contact/contact.db`` and ``message/message_N.db`` under ``root/wx``.
+
+    Returns (wx_dir, {relative path: plaintext bytes}).
+    """
+    root = Path(root)
+    plain_dir = root / "plain"
+    plain_dir.mkdir(parents=True)
+    _build_contact_db(plain_dir / "contact.db")
+    for shard in MESSAGES:
+        _build_message_db(plain_dir / f"message_{shard}.db", shard)
+
+    wx_dir = root / "wx"
+    plains = {}
+    for plain_path in sorted(plain_dir.glob("*.db")):
+        relative = ("contact/" if plain_path.stem == "contact" else "message/") + plain_path.name
+        plain = plain_path.read_bytes()
+        target = wx_dir / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(encrypt_db(plain)[0])
+        plains[relative] = plain
+    return wx_dir, plains
+
+
+def expected_messages(wxid):
+    """(create_time, sender, text) of ``wxid`` over every shard, oldest first."""
+    return sorted((t, sender, text) for shard in MESSAGES.values() for t, sender, text, _ in shard.get(wxid, []))
@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+from core.contact_index import PINYIN_AVAILABLE, ContactIndex, ContactSearchSession
+from core.contact_record import CONTACT_COLUMNS, ContactRecord
+
+
+def _record(i, username, remark="", nick_name="", description=""):
+    values = {"id": i, "username": username, "remark": remark, "nick_name": nick_name, "description": description}
+    return ContactRecord(tuple(values.get(column) for column in CONTACT_COLUMNS))
+
+
+def _usernames(records):
+    return [record.username for record in records]
+
+
+def test_ranking_follows_field_priority():
+    index = ContactIndex([
+        _record(1, "wxid_desc", description="abc"),
+        _record(2, "wxid_abc"),
+        _record(3, "wxid_nick", nick_name="ABC"),
+        _record(4, "wxid_remark", remark="xabc"),
+    ])
+    assert _usernames(index.search("abc")) == ["wxid_remark", "wxid_nick", "wxid_abc", "wxid_desc"]
+    assert _usernames(index.search("abc", prefix=True)) == ["wxid_nick", "wxid_desc"]
+    assert index.get("wxid_nick").nick_name == "ABC"
+
+
+@pytest.mark.skipif(not PINYIN_AVAILABLE, reason="pypinyin is not installed")
+def test_pinyin_and_initials():
+    index = ContactIndex([_record(1, "wxid_a", remark="张三"), _record(2, "wxid_b", nick_name="李四")])
+    assert _usernames(index.search("zhangsan")) == ["wxid_a"]
+    assert _usernames(index.search("ls")) == ["wxid_b"]
+
+
+def test_limit_and_narrowing_match_a_full_search():
+    rng = random.Random(0)
+    alphabet = "abcde"
+    records = [
+        _record(i, f"u{i}", remark="".join(rng.choice(alphabet) for _ in range(6)),
+                nick_name="".join(rng.choice(alphabet) for _ in range(6)))
+        for i in range(500)
+    ]
+    index = ContactIndex(records)
+    session = ContactSearchSession()
+    for _ in range(50):
+        query = ""
+        for step, ch in enumerate(rng.choices(alphabet, k=4)):
+            query += ch
+            full = index.search(query)
+            assert index.search(query, limit=10) == full[:10]
+            # 被截断的结果不能用来收窄下一次查询
+            limit = 10 if step % 2 == 0 else None
+            assert session.search(index, query, limit=limit) == full[:limit]
@@ -0,0 +1,22 @@
+from core.all_users import get_all_users
+from core.get_friend_info import single_user_info
+from core.search_users import search_users
+from helpers import KEY
+
+
+def test_all_users_lists_friends(decrypted_dir):
+    users = get_all_users(str(decrypted_dir / "contact.sqlite"))
+    assert [u["username"] for u in users] == ["wxid_f0", "wxid_f1", "wxid_f2", "wxid_f3", "wxid_silent"]
+    assert get_all_users(str(decrypted_dir / "missing.sqlite")) is None
+
+
+def test_search_users(wechat, decrypted_dir):
+    assert [u["username"] for u in search_users(str(decrypted_dir / "contact.sqlite"), "老赵")] == ["wxid_f3"]
+    wx_dir, _ = wechat
+    assert [u["username"] for u in search_users(str(wx_dir / "contact/contact.db"), "李四", hex_key=KEY)] == ["wxid_f1"]
+
+
+def test_single_user_info(decrypted_dir):
+    info = single_user_info(decrypted_dir / "contact.sqlite", "wxid_f0")
+    assert (info.wxid, info.remark_name) == ("wxid_f0", "张三")
+    assert single_user_info(decrypted_dir / "contact.sqlite", "nobody") is None
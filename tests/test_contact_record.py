@@ -0,0 +1,15 @@
+from core.contact_record import load_contacts
+from helpers import CONTACTS, KEY
+
+
+def test_loads_slim_rows_and_fetches_other_columns_lazily(wechat, decrypted_dir):
+    records = load_contacts(decrypted_dir / "contact.sqlite")
+    assert [r.username for r in records] == list(CONTACTS)
+    first = records[0]
+    assert "extra_buffer" not in first.keys()
+    assert first["extra_buffer"] == b"extra-wxid_f0"
+    assert first.get("missing", "default") == "default"
+
+    wx_dir, _ = wechat
+    friends = load_contacts(wx_dir / "contact/contact.db", KEY, where="local_type = ?", params=(3,))
+    assert [(r.username, r.nick_name) for r in friends] == [("wxid_stranger", "群里的路人")]
@@ -0,0 +1,31 @@
+from core.contact_stats import YEAR_SECONDS, contact_ranks, query_contact_stats, rank_of, update_contact_stats
+from core.msg_table_index import find_message_dbs
+from helpers import ME, md5
+
+# 近一年只包含 message_1 中的消息
+NOW = 1700000500 + YEAR_SECONDS
+
+
+def test_counts_and_ratios(decrypted_dir, tmp_path):
+    db_paths = find_message_dbs(decrypted_dir / "contact.sqlite")
+    assert update_contact_stats(tmp_path, db_paths, ME, now=NOW) == 4
+    assert update_contact_stats(tmp_path, db_paths, ME, now=NOW) == -1
+
+    stats = {row["contact"]: row for row in query_contact_stats(tmp_path)}
+    f0 = stats["wxid_f0"]
+    assert (f0["message_count"], f0["my_count"], f0["their_count"], f0["my_ratio"]) == (4, 2, 2, 1.0)
+    assert (f0["first_time"], f0["last_time"], f0["last_year_count"], f0["active_days_last_year"]) == (
+        1700000000, 1710000100, 2, 1,
+    )
+    assert stats["wxid_f1"]["my_ratio"] == 0.0
+    assert stats["wxid_f2"]["my_ratio"] is None
+
+    ordered = [row["contact"] for row in query_contact_stats(tmp_path, "message_count", min_messages=2)]
+    assert ordered == ["wxid_f0", "wxid_f2"]
+    recent = [row["contact"] for row in query_contact_stats(tmp_path, active_since=1710000150)]
+    assert recent == ["wxid_f2"]
+
+    ranks = contact_ranks(tmp_path, "last_time")
+    assert rank_of(ranks, "wxid_f2") == 0
+    assert rank_of(ranks, "wxid_silent") is None
+    assert rank_of({md5("wxid_x"): 3}, "wxid_x") == 3
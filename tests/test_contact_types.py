@@ -0,0 +1,16 @@
+from core.contact_types import CHATROOM, FRIEND, GROUP_ONLY, OFFICIAL, classify_contact, get_contact_type_index
+
+
+def test_classifies_contacts_and_searches_friends_only(decrypted_dir):
+    types = get_contact_type_index(decrypted_dir / "contact.sqlite")
+    assert types.counts() == {FRIEND: 5, GROUP_ONLY: 1, OFFICIAL: 1, CHATROOM: 1}
+    assert types.type_of("gh_news") == OFFICIAL
+    assert types.is_friend("wxid_silent")
+    assert [r.username for r in types.search_index(FRIEND).search("群")] == []
+    assert [r.username for r in types.search_index(GROUP_ONLY).search("群")] == ["wxid_stranger"]
+
+
+def test_unknown_type_uses_chat_history():
+    assert classify_contact("wxid_x", 0, 0, has_chat=True) == FRIEND
+    assert classify_contact("wxid_x", 0, 0, has_chat=False) == GROUP_ONLY
+    assert classify_contact("wxid_x", 0, 0) == FRIEND
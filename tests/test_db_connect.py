@@ -0,0 +1,35 @@
+import os
+import sqlite3
+
+from core.db_connect import SignatureCache, acquire_db, close_pooled_connections, release_db
+
+
+def test_pool_reuses_idle_connections(decrypted_dir):
+    db_path = decrypted_dir / "contact.sqlite"
+    conn = acquire_db(db_path)
+    release_db(conn)
+    again = acquire_db(db_path)
+    try:
+        assert again is conn
+        assert again.execute("SELECT COUNT(*) AS n FROM contact").fetchone()["n"] > 0
+    finally:
+        release_db(again)
+    close_pooled_connections()
+
+
+def test_signature_cache_rebuilds_only_after_change(tmp_path):
+    db_path = tmp_path / "a.sqlite"
+    sqlite3.connect(db_path).close()
+    builds = []
+    cache = SignatureCache()
+
+    def build():
+        builds.append(1)
+        return len(builds)
+
+    assert cache.get(db_path, build) == 1
+    assert cache.get(db_path, build) == 1
+    assert cache.get(db_path, build, variant="other") == 2
+    stat = db_path.stat()
+    os.utime(db_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.get(db_path, build) == 3
@@ -0,0 +1,46 @@
+import pytest
+
+from core.db_selection import select_db_files
+
+# 相对路径 -> 文件大小
+FILES = {
+    "message/message_0.db": 300,
+    "message/message_fts.db": 500,
+    "contact/contact.db": 100,
+    "session/session.db": 200,
+    "message/message_1.db": 400,
+}
+
+
+@pytest.fixture
+def db_files(tmp_path):
+    paths = []
+    for relative, size in FILES.items():
+        path = tmp_path / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(bytes(size))
+        paths.append(path)
+    return tmp_path, paths
+
+
+def test_all_profile_orders_by_priority_then_size(db_files):
+    base, paths = db_files
+    selected = select_db_files(paths, base)
+    assert [p.name for p in selected] == ["contact.db", "message_1.db", "message_0.db", "message_fts.db", "session.db"]
+
+
+def test_friends_profile_and_exclude(db_files):
+    base, paths = db_files
+    selected = select_db_files(paths, base, profile="friends", exclude=["message/message_1.db"])
+    assert [p.name for p in selected] == ["contact.db", "message_0.db"]
+
+
+def test_explicit_priority_overrides_profile(db_files):
+    base, paths = db_files
+    assert select_db_files(paths, base, priority=["session.db"])[0].name == "session.db"
+
+
+def test_unknown_profile_is_an_error(db_files):
+    base, paths = db_files
+    with pytest.raises(ValueError):
+        select_db_files(paths, base, profile="nope")
@@ -0,0 +1,38 @@
+import os
+
+from core.direct_decrypt import decrypt_all_db
+from helpers import KEY, PAGE_SIZE, derive_keys, encrypt_page
+
+
+def test_rerun_skips_unchanged_and_rewrites_changed_pages(wechat, wechat_copy, tmp_path):
+    _, plains = wechat
+    out_dir = tmp_path / "out"
+    assert decrypt_all_db(wechat_copy, out_dir, KEY, max_workers=1)
+    mtimes = {p.name: p.stat().st_mtime_ns for p in out_dir.glob("*.sqlite")}
+
+    assert decrypt_all_db(wechat_copy, out_dir, KEY, max_workers=1)
+    assert {p.name: p.stat().st_mtime_ns for p in out_dir.glob("*.sqlite")} == mtimes
+
+    # 重新加密 contact.db 的最后一页，内容改变
+    db_file = wechat_copy / "contact/contact.db"
+    data = bytearray(db_file.read_bytes())
+    salt = bytes(data[:16])
+    plain = bytearray(plains["contact/contact.db"])
+    last = len(plain) // PAGE_SIZE - 1
+    plain[last * PAGE_SIZE + 100] ^= 0xFF
+    data[last * PAGE_SIZE:] = encrypt_page(bytes(plain[last * PAGE_SIZE:]), last + 1, derive_keys(KEY, salt), salt)
+    db_file.write_bytes(data)
+    stat = db_file.stat()
+    os.utime(db_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert decrypt_all_db(wechat_copy, out_dir, KEY, max_workers=1)
+    assert (out_dir / "contact.sqlite").read_bytes() == bytes(plain)
+    assert (out_dir / "message_0.sqlite").stat().st_mtime_ns == mtimes["message_0.sqlite"]
+
+
+def test_manifest_is_dropped_when_key_changes(decrypted_dir):
+    from core.decrypt_manifest import DecryptManifest
+
+    out_file = decrypted_dir / "contact.sqlite"
+    assert DecryptManifest(decrypted_dir, KEY).old_prints(out_file.name, out_file) is not None
+    assert DecryptManifest(decrypted_dir, "cd" * 32).old_prints(out_file.name, out_file) is None
@@ -0,0 +1,23 @@
+from core.direct_decrypt import decrypt_all_db, decrypt_wechat_db, find_probe_db, verify_key
+from helpers import KEY, WRONG_KEY
+
+
+def test_decrypt_all_db_is_byte_exact(wechat, decrypted_dir):
+    _, plains = wechat
+    for relative, plain in plains.items():
+        out_file = decrypted_dir / relative.split("/")[-1].replace(".db", ".sqlite")
+        assert out_file.read_bytes() == plain
+
+
+def test_wrong_key_writes_nothing(wechat, tmp_path):
+    wx_dir, _ = wechat
+    assert not verify_key(find_probe_db(wx_dir), WRONG_KEY)
+    assert decrypt_all_db(wx_dir, tmp_path / "out", WRONG_KEY, max_workers=1) is False
+    assert not list((tmp_path / "out").glob("*.sqlite"))
+
+
+def test_single_file_in_small_chunks(wechat, tmp_path):
+    wx_dir, plains = wechat
+    out_file = tmp_path / "message_0.sqlite"
+    assert decrypt_wechat_db(wx_dir / "message/message_0.db", out_file, KEY, chunk_pages=1)
+    assert out_file.read_bytes() == plains["message/message_0.db"]
@@ -0,0 +1,33 @@
+import pytest
+
+from core.encrypted_vfs import VFS_AVAILABLE, open_encrypted_db
+from helpers import CONTACTS, KEY
+
+pytestmark = pytest.mark.skipif(not VFS_AVAILABLE, reason="apsw is not installed")
+
+
+def test_reads_encrypted_db_without_decrypting_to_disk(wechat):
+    wx_dir, _ = wechat
+    conn = open_encrypted_db(wx_dir / "contact/contact.db", KEY, cache_pages=1)
+    try:
+        rows = list(conn.execute("SELECT username, remark FROM contact ORDER BY id"))
+    finally:
+        conn.close()
+    assert [(row["username"], row["remark"]) for row in rows] == [(u, v[1]) for u, v in CONTACTS.items()]
+
+
+def test_reads_match_decrypted_copy(wechat, decrypted_dir):
+    import sqlite3
+
+    wx_dir, _ = wechat
+    query = "SELECT * FROM Name2Id ORDER BY rowid"
+    conn = open_encrypted_db(wx_dir / "message/message_1.db", KEY)
+    try:
+        through_vfs = [tuple(row.values()) for row in conn.execute(query)]
+    finally:
+        conn.close()
+    plain = sqlite3.connect(decrypted_dir / "message_1.sqlite")
+    try:
+        assert through_vfs == plain.execute(query).fetchall()
+    finally:
+        plain.close()
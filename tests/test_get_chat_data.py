@@ -0,0 +1,32 @@
+from core.get_chat_data import single_user_all_msg
+from core.msg_table_index import find_message_dbs
+from helpers import KEY, expected_messages
+
+
+def _text(content):
+    return content.decode("utf-8") if isinstance(content, bytes) else content
+
+
+def _as_tuples(messages):
+    return [(m.create_time, m.sender_name, _text(m.message_content)) for m in messages]
+
+
+def test_merges_shards_newest_first_and_decompresses(decrypted_dir):
+    db_paths = find_message_dbs(decrypted_dir / "contact.sqlite")
+    messages = single_user_all_msg(db_paths, "wxid_f0", None)
+    assert _as_tuples(messages) == expected_messages("wxid_f0")[::-1]
+
+
+def test_limit_and_time_range(decrypted_dir):
+    db_paths = find_message_dbs(decrypted_dir / "contact.sqlite")
+    expected = expected_messages("wxid_f0")[::-1]
+    assert _as_tuples(single_user_all_msg(db_paths, "wxid_f0", None, limit=3)) == expected[:3]
+    in_range = single_user_all_msg(db_paths, "wxid_f0", None, start_time=1700000100, end_time=1710000100)
+    assert [m.create_time for m in in_range] == [1710000000, 1700000100]
+
+
+def test_reads_encrypted_shards_directly(wechat):
+    wx_dir, _ = wechat
+    db_paths = find_message_dbs(wx_dir / "contact/contact.db", KEY)
+    assert _as_tuples(single_user_all_msg(db_paths, "wxid_f2", None, hex_key=KEY)) == expected_messages("wxid_f2")[::-1]
+    assert single_user_all_msg(db_paths, "wxid_silent", None, hex_key=KEY) == []
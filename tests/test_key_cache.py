@@ -0,0 +1,10 @@
+from core.key_cache import cached_keys, get_derived_keys
+from helpers import KEY, derive_keys
+
+
+def test_derived_keys_match_sqlcipher_and_are_cached():
+    raw_key, salt = bytes.fromhex(KEY), bytes(range(16))
+    keys = get_derived_keys(raw_key, salt)
+    assert keys == derive_keys(KEY, salt)
+    assert cached_keys(raw_key, salt) == keys
+    assert cached_keys(raw_key, bytes(16)) is None
@@ -0,0 +1,23 @@
+from core.message_search import search_messages, update_message_fts
+
+
+def _found(decrypted_dir, query, **kwargs):
+    return [(contact, m.message_content) for contact, m in search_messages(decrypted_dir, query, **kwargs)]
+
+
+def test_long_and_short_queries(decrypted_dir):
+    # 3 个字以上走 trigram 索引，1~2 个字走单字 / 双字索引
+    assert _found(decrypted_dir, "找工作") == [("wxid_f1", "找工作好难")]
+    assert _found(decrypted_dir, "睡了") == [("wxid_f0", "宝宝睡了")]
+    assert _found(decrypted_dir, "在") == [("wxid_f2", "在吗")]
+    assert _found(decrypted_dir, "HELLO") == [("wxid_f0", "hello world")]
+    assert _found(decrypted_dir, "o w") == [("wxid_f0", "hello world")]
+    assert _found(decrypted_dir, "不存在的词") == []
+
+
+def test_filters_and_reindex(decrypted_dir):
+    assert _found(decrypted_dir, "说话", contact="123@chatroom") == [("123@chatroom", "群里说话")]
+    assert _found(decrypted_dir, "说话", contact="wxid_f0") == []
+    assert _found(decrypted_dir, "快乐", end_time=1700000000) == []
+    # 已全部建立索引，重复更新不会再写入
+    assert update_message_fts(decrypted_dir) == 0
@@ -0,0 +1,22 @@
+import shutil
+
+from core.message_store import iter_store_msgs, store_is_current, update_message_store
+from core.msg_table_index import find_message_dbs
+from helpers import CONTACTS, MESSAGES, expected_messages
+
+
+def test_store_matches_shards_and_updates_incrementally(decrypted_dir, tmp_path):
+    cache_dir = tmp_path / "cache"
+    shutil.copytree(decrypted_dir, cache_dir, ignore=shutil.ignore_patterns("messages.sqlite*", "*.json"))
+    db_paths = find_message_dbs(cache_dir / "contact.sqlite")
+    assert not store_is_current(cache_dir, db_paths)
+
+    total = sum(len(messages) for shard in MESSAGES.values() for messages in shard.values())
+    assert update_message_store(cache_dir, db_paths) == total
+    assert store_is_current(cache_dir, db_paths)
+    assert update_message_store(cache_dir, db_paths) == 0
+
+    for wxid in list(CONTACTS):
+        stored = [(m.create_time, m.sender_name, m.message_content) for m in iter_store_msgs(cache_dir, wxid)]
+        assert stored == expected_messages(wxid)[::-1]
+    assert [m.create_time for m in iter_store_msgs(cache_dir, "wxid_f0", limit=1)] == [1710000100]
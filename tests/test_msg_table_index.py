@@ -0,0 +1,23 @@
+from pathlib import Path
+
+from core.msg_table_index import find_message_dbs, get_msg_table_index
+from helpers import KEY, md5
+
+
+def test_locates_chat_tables_across_shards(decrypted_dir):
+    db_paths = find_message_dbs(decrypted_dir / "contact.sqlite")
+    assert [p.name for p in db_paths] == ["message_0.sqlite", "message_1.sqlite"]
+    index = get_msg_table_index(decrypted_dir)
+    assert [Path(p).name for p in index.locate("wxid_f0", db_paths)] == [
+        "message_0.sqlite",
+        "message_1.sqlite",
+    ]
+    assert index.locate("wxid_f2", db_paths) == [str(db_paths[1])]
+    assert index.locate("wxid_silent", db_paths) == []
+    assert index.wxid_for(md5("wxid_f1")) == "wxid_f1"
+
+
+def test_finds_encrypted_shards(wechat):
+    wx_dir, _ = wechat
+    db_paths = find_message_dbs(wx_dir / "contact/contact.db", KEY)
+    assert [p.name for p in db_paths] == ["message_0.db", "message_1.db"]
@@ -0,0 +1,12 @@
+from core.name2id_cache import get_sender_names, resolve_sender
+from helpers import CONTACTS, KEY, ME
+
+
+def test_sender_ids_resolve_to_usernames(wechat, decrypted_dir):
+    names = get_sender_names(decrypted_dir / "message_0.sqlite")
+    assert [name for name in names if name] == [ME] + list(CONTACTS)
+    assert resolve_sender(names, names.index("wxid_f1")) == "wxid_f1"
+    assert resolve_sender(names, 999) == 999
+    # 直接读取加密库得到相同的结果
+    wx_dir, _ = wechat
+    assert get_sender_names(wx_dir / "message/message_0.db", KEY) == names
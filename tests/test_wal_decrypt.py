@@ -0,0 +1,50 @@
+from core.direct_decrypt import decrypt_all_db
+from core.wal_decrypt import read_committed_frames, wal_path_for
+from helpers import KEY, PAGE_SIZE, derive_keys, make_wal
+
+
+def _changed_page(plain, index):
+    page = bytearray(plain[index * PAGE_SIZE:(index + 1) * PAGE_SIZE])
+    page[200] ^= 0xFF
+    return bytes(page)
+
+
+def test_only_committed_frames_are_applied(wechat, wechat_copy, tmp_path):
+    _, plains = wechat
+    plain = plains["contact/contact.db"]
+    db_file = wechat_copy / "contact/contact.db"
+    salt = db_file.read_bytes()[:16]
+    keys = derive_keys(KEY, salt)
+    page_count = len(plain) // PAGE_SIZE
+    last = page_count - 1
+    committed = _changed_page(plain, last)
+    # 新增一页并提交，最后一帧没有提交，不应生效
+    appended = bytes(PAGE_SIZE - 80) + bytes(80)
+    wal = make_wal(
+        [(last + 1, committed, 0), (page_count + 1, appended, page_count + 1), (1, _changed_page(plain, 0), 0)],
+        keys,
+        salt,
+    )
+    wal_path_for(db_file).write_bytes(wal)
+
+    frames, db_pages = read_committed_frames(wal_path_for(db_file))
+    assert db_pages == page_count + 1
+    assert sorted(frames) == [last, page_count]
+
+    out_dir = tmp_path / "out"
+    assert decrypt_all_db(wechat_copy, out_dir, KEY, max_workers=1, include=["contact.db"])
+    expected = plain[:last * PAGE_SIZE] + committed + appended
+    assert (out_dir / "contact.sqlite").read_bytes() == expected
+
+
+def test_frames_with_stale_salt_are_ignored(wechat, wechat_copy):
+    _, plains = wechat
+    plain = plains["contact/contact.db"]
+    db_file = wechat_copy / "contact/contact.db"
+    salt = db_file.read_bytes()[:16]
+    wal = make_wal([(1, plain[:PAGE_SIZE], len(plain) // PAGE_SIZE)], derive_keys(KEY, salt), salt)
+    # 帧头中的 salt 与 WAL 头不一致：上一轮 WAL 留下的帧
+    stale = bytearray(wal)
+    stale[32 + 8:32 + 12] = (99).to_bytes(4, "big")
+    wal_path_for(db_file).write_bytes(bytes(stale))
+    assert read_committed_frames(wal_path_for(db_file)) == ({}, 0)
@@ -0,0 +1,89 @@
+# 页解密吞吐量基准测试：对比逐页 AES-CBC 的旧实现与批量 ECB + numpy 的新实现
+# 开发用脚本，不随应用打包。在仓库根目录运行：python tools/bench_decrypt.py [页数]
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from Crypto.Cipher import AES
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from core.direct_decrypt import _decrypt_file
+from core.utils.wechat_constants import WeChatDecryptConstants
+
+
+# 生成一个随机内容的加密数据库（只保证页结构正确，不计算 HMAC）
+def _make_encrypted_db(path, enc_key, page_count):
+    constants = WeChatDecryptConstants()
+    page_size = constants.PAGE_SIZE
+    data_end = page_size - constants.RESERVE_SIZE
+    with open(path, "wb") as f:
+        for i in range(page_count):
+            offset = constants.SALT_SIZE if i == 0 else 0
+            iv = os.urandom(constants.IV_SIZE)
+            plain = os.urandom(data_end - offset)
+            head = os.urandom(constants.SALT_SIZE) if i == 0 else b""
+            cipher = AES.new(enc_key, AES.MODE_CBC, iv)
+            f.write(head + cipher.encrypt(plain) + iv + os.urandom(constants.HMAC_SIZE))
+
+
+# 改造前的页循环：整文件读入内存，每页新建 cipher、切片并分三次写出
+def _legacy_decrypt(input_path, output_path, enc_key):
+    constants = WeChatDecryptConstants()
+    page_size = constants.PAGE_SIZE
+    salt_size = constants.SALT_SIZE
+    reserve_size = constants.RESERVE_SIZE
+    iv_size = constants.IV_SIZE
+    with open(input_path, "rb") as f:
+        data = f.read()
+    with open(output_path, "wb") as f_out:
+        for i in range(len(data) // page_size):
+            page_start = i * page_size
+            page_data = data[page_start : page_start + page_size]
+            iv = page_data[page_size - reserve_size : page_size - reserve_size + iv_size]
+            if i == 0:
+                content = page_data[salt_size : page_size - reserve_size]
+            else:
+                content = page_data[: page_size - reserve_size]
+            cipher = AES.new(enc_key, AES.MODE_CBC, iv)
+            decrypted = cipher.decrypt(content)
+            if i == 0:
+                f_out.write(constants.SQLITE_FILE_HEADER)
+                f_out.write(decrypted)
+                f_out.write(b"\0" * reserve_size)
+            else:
+                f_out.write(decrypted)
+                f_out.write(b"\0" * reserve_size)
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def run_benchmark(page_count=16384, repeat=3):
+    enc_key = os.urandom(WeChatDecryptConstants().KEY_SIZE)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        src = os.path.join(tmp_dir, "bench.db")
+        legacy_out = os.path.join(tmp_dir, "legacy.sqlite")
+        batch_out = os.path.join(tmp_dir, "batch.sqlite")
+        _make_encrypted_db(src, enc_key, page_count)
+
+        legacy = min(_timed(_legacy_decrypt, src, legacy_out, enc_key) for _ in range(repeat))
+        batch = min(_timed(_decrypt_file, src, batch_out, enc_key) for _ in range(repeat))
+
+        with open(legacy_out, "rb") as f_a, open(batch_out, "rb") as f_b:
+            same = f_a.read() == f_b.read()
+
+    print(f"页数: {page_count} ({page_count * WeChatDecryptConstants().PAGE_SIZE / 1024 / 1024:.0f} MB)")
+    print(f"改造前（逐页 CBC）: {page_count / legacy:,.0f} 页/秒")
+    print(f"改造后（批量 ECB）: {page_count / batch:,.0f} 页/秒")
+    print(f"加速比: {legacy / batch:.2f}x，输出一致: {same}")
+    return page_count / legacy, page_count / batch
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 16384)